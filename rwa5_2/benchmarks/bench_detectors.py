@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+'''
+Latency of the YOLO inference backends on the CPU.
+
+Times one image through the ultralytics backend, the ONNX export and,
+with --int8, its INT8 quantization (see rwa5_2/detectors.py), and checks
+that the exported models keep the confident detections of the PyTorch
+model. Needs ultralytics, onnxruntime and OpenCV, but no ROS installation.
+The ONNX models are exported next to the weights when missing:
+
+    python3 benchmarks/bench_detectors.py --weights best.pt --images frames/ --int8 --output new.json
+    python3 benchmarks/bench_detectors.py --weights best.pt --output new.json --compare old.json
+'''
+import argparse
+import glob
+import itertools
+import json
+import os
+import platform
+import sys
+
+import cv2
+import numpy as np
+
+# Also puts the rwa5_2 sources on the path
+from bench_perception import compare, git_revision, measure
+
+from detectors import OnnxDetector, UltralyticsDetector, export_onnx  # noqa: E402
+
+# Minimum confidence of the detections used by the nodes, as in yolo_common
+CONFIDENCE_THRESHOLD = 0.7
+
+
+def load_images(folder: str, count: int, seed: int) -> list:
+    '''
+    BGR images of a folder, or random 640x480 images when no folder is given.
+    '''
+    if folder:
+        paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+        return [cv2.imread(path) for path in paths[:count]]
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def agreement(reference, detections) -> float:
+    '''
+    Fraction of the confident reference boxes found with the same class and an IoU above 0.5.
+    '''
+    found = total = 0
+    for (ref_xyxy, ref_conf, ref_cls), (xyxy, conf, cls) in zip(reference, detections):
+        for box, box_cls in zip(ref_xyxy[ref_conf > CONFIDENCE_THRESHOLD], ref_cls[ref_conf > CONFIDENCE_THRESHOLD]):
+            total += 1
+            candidates = xyxy[(cls == box_cls) & (conf > CONFIDENCE_THRESHOLD)]
+            if not len(candidates):
+                continue
+            width = np.clip(np.minimum(box[2], candidates[:, 2]) - np.maximum(box[0], candidates[:, 0]), 0.0, None)
+            height = np.clip(np.minimum(box[3], candidates[:, 3]) - np.maximum(box[1], candidates[:, 1]), 0.0, None)
+            intersection = width * height
+            union = ((box[2] - box[0]) * (box[3] - box[1])
+                     + (candidates[:, 2] - candidates[:, 0]) * (candidates[:, 3] - candidates[:, 1]) - intersection)
+            found += bool((intersection / union > 0.5).any())
+    return found / total if total else float("nan")
+
+
+def run(args) -> dict:
+    '''
+    Run all the backends on the same images.
+    '''
+    images = load_images(args.images, args.count, args.seed)
+    onnx_path = args.onnx or export_onnx(args.weights, args.input_size)
+    detectors = {
+        "ultralytics": UltralyticsDetector(args.weights),
+        "onnx": OnnxDetector(onnx_path, args.input_size, num_threads=args.threads),
+    }
+    if args.int8:
+        int8_path = export_onnx(args.weights, args.input_size, int8=True, calibration_images=images)
+        detectors["onnx[int8]"] = OnnxDetector(int8_path, args.input_size, num_threads=args.threads)
+
+    results = {}
+    reference = detectors["ultralytics"](images)
+    for name, detector in detectors.items():
+        # Warm up, the first runs allocate the buffers of the runtime
+        for image in images[:2]:
+            detector([image])
+        counter = itertools.count()
+        results[f"{name}[1 image]"] = measure(
+            lambda: detector([images[next(counter) % len(images)]]), args.number, args.repeat)
+        detections = [detector([image])[0] for image in images]
+        results[f"{name}[1 image]"]["agreement"] = agreement(reference, detections)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "weights": args.weights,
+            "images": args.images or "random",
+            "count": len(images),
+            "input_size": args.input_size,
+            "threads": args.threads,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", required=True, help="YOLO .pt weights")
+    parser.add_argument("--onnx", help="ONNX export of the weights, exported next to them when not given")
+    parser.add_argument("--int8", action="store_true", help="also time the INT8 quantization of the export")
+    parser.add_argument("--images", help="folder of camera images, random images when not given")
+    parser.add_argument("--count", type=int, default=16, help="images used")
+    parser.add_argument("--input-size", type=int, default=640, help="input size of the export")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime threads, 0 for the default")
+    parser.add_argument("--number", type=int, default=10, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=3, help="timings per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+    elif not args.output:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+'''
+Microbenchmarks of the pose math and of the SensorRead parsing and queries.
+
+Synthetic advanced logical camera frames are built from stand-in message
+classes (see stand_ins.py), so no ROS installation or graph is needed.
+Results are written as JSON and can be compared with the results of another
+commit:
+
+    python3 benchmarks/bench_perception.py --parts 9 --cameras 8 --output new.json
+    python3 benchmarks/bench_perception.py --output new.json --compare old.json
+'''
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+import stand_ins
+
+stand_ins.install()
+
+import pose_kernels as PK  # noqa: E402
+import utils  # noqa: E402
+from sensor_read import SensorRead  # noqa: E402
+from sensor_store import PlacedPartIndex  # noqa: E402
+from utils import AdvancedLogicalCameraImage  # noqa: E402
+
+PART_COLORS = [0, 1, 2, 3, 4]
+PART_TYPES = [10, 11, 12, 13]
+
+
+def make_pose(array) -> stand_ins.Pose:
+    '''
+    Build a stand-in Pose from a (7,) pose array.
+    '''
+    return PK.array_to_pose_msg(array, stand_ins.Pose())
+
+
+def random_pose(rng) -> np.ndarray:
+    '''
+    Random pose with a unit quaternion.
+    '''
+    quat = rng.normal(size=4)
+    return np.concatenate([rng.uniform(-1.0, 1.0, 3), quat / np.linalg.norm(quat)])
+
+
+def camera_names(count: int):
+    '''
+    Names of the synthetic cameras, cycling through bins, kts tables and AGVs.
+    '''
+    names = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            names.append(f"bins{i}_camera")
+        elif kind == 1:
+            names.append(f"kts{i}_camera")
+        else:
+            names.append(f"agv{i % 4 + 1}_camera{i}")
+    return names
+
+
+def make_frame(rng, sensor_pose, n_parts, n_trays) -> stand_ins.AdvancedLogicalCameraImage:
+    '''
+    Synthetic AdvancedLogicalCameraImage with random parts and trays.
+    '''
+    msg = stand_ins.AdvancedLogicalCameraImage()
+    msg.sensor_pose = make_pose(sensor_pose)
+    for _ in range(n_parts):
+        part_pose = stand_ins.PartPose()
+        part_pose.part.color = int(rng.choice(PART_COLORS))
+        part_pose.part.type = int(rng.choice(PART_TYPES))
+        part_pose.pose = make_pose(random_pose(rng))
+        msg.part_poses.append(part_pose)
+    for _ in range(n_trays):
+        tray = stand_ins.KitTrayPose()
+        tray.id = int(rng.integers(0, 10))
+        tray.pose = make_pose(random_pose(rng))
+        msg.tray_poses.append(tray)
+    return msg
+
+
+def measure(fn, number, repeat) -> dict:
+    '''
+    Time a callable and return the per-call timings in microseconds.
+    '''
+    timings = timeit.Timer(fn).repeat(repeat=repeat, number=number)
+    per_call = [t / number * 1e6 for t in timings]
+    return {
+        "min_us": min(per_call),
+        "median_us": statistics.median(per_call),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def git_revision() -> str:
+    '''
+    Commit of the working tree, empty if git is not available.
+    '''
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def make_sensor_read(names, **kwargs) -> SensorRead:
+    '''
+    SensorRead on a stand-in node, with the synthetic cameras added to its configuration.
+    '''
+    sensor_read = SensorRead(stand_ins.Node(), None, **kwargs)
+    for name in names:
+        sensor_read.yaml_data["sensors"].setdefault(name, {"type": "advanced_logical_camera"})
+    return sensor_read
+
+
+def run(args) -> dict:
+    '''
+    Run all the benchmarks.
+    '''
+    rng = np.random.default_rng(args.seed)
+    names = camera_names(args.cameras)
+    sensor_poses = {name: random_pose(rng) for name in names}
+    frames = {name: [make_frame(rng, sensor_poses[name], args.parts, args.trays) for _ in range(args.variants)]
+              for name in names}
+    results = {}
+
+    # Pose math
+    pose_1, pose_2 = make_pose(random_pose(rng)), make_pose(random_pose(rng))
+    results["Mult_pose"] = measure(lambda: utils.Mult_pose(pose_1, pose_2), args.number, args.repeat)
+    results["Quart_to_RPY"] = measure(lambda: utils.Quart_to_RPY(pose_1.orientation), args.number, args.repeat)
+    results["RPY_to_Quart"] = measure(lambda: utils.RPY_to_Quart((0.1, 0.2, 0.3)), args.number, args.repeat)
+    batch = np.array([random_pose(rng) for _ in range(args.parts)])
+    sensor = random_pose(rng)
+    results["pose_kernels.mult_pose[batch]"] = measure(lambda: PK.mult_pose(sensor, batch), args.number, args.repeat)
+
+    # Parsing of one frame
+    name = names[0]
+    frame = frames[name][0]
+    image = AdvancedLogicalCameraImage(frame.part_poses, frame.tray_poses, frame.sensor_pose)
+    sensor_read = make_sensor_read(names, dedup_tolerance=None)
+    store = sensor_read.parse_advanced_camera_image(image, name)
+    results["parse_advanced_camera_image"] = measure(
+        lambda: sensor_read.parse_advanced_camera_image(image, name, store), args.number, args.repeat)
+
+    # Callbacks, one new frame of every camera per call
+    counter = itertools.count()
+
+    def ingest_all(sensor_read):
+        variant = next(counter) % args.variants
+        for name in names:
+            sensor_read._advanced_camera_cb(frames[name][variant], name)
+
+    eager = make_sensor_read(names, dedup_tolerance=None)
+    results["callback[eager, all cameras]"] = measure(lambda: ingest_all(eager), args.number, args.repeat)
+    lazy = make_sensor_read(names, lazy=True, dedup_tolerance=None)
+    results["callback[lazy, all cameras]"] = measure(lambda: ingest_all(lazy), args.number, args.repeat)
+    dedup = make_sensor_read(names)
+    duplicate = frames[name][0]
+    dedup._advanced_camera_cb(duplicate, name)
+    results["callback[duplicate frame]"] = measure(
+        lambda: dedup._advanced_camera_cb(duplicate, name), args.number, args.repeat)
+
+    # Queries on a populated SensorRead, for a part and a tray that exist
+    ingest_all(eager)
+    bins_store, kts_store = eager.sensor_data[names[0]], eager.sensor_data[names[1]]
+    part_type, part_color = int(bins_store.type[0]), int(bins_store.color[0])
+    tray_id = int(kts_store.tray_id[args.parts]) if args.trays else 0
+    placed = PlacedPartIndex()
+    results["get_part_pose_from_sensor"] = measure(
+        lambda: eager.get_part_pose_from_sensor(part_type, part_color), args.number, args.repeat)
+    results["get_part_pose_from_agv"] = measure(
+        lambda: eager.get_part_pose_from_agv(placed, part_type, part_color), args.number, args.repeat)
+    results["get_tray_pose_from_sensor"] = measure(
+        lambda: eager.get_tray_pose_from_sensor(tray_id), args.number, args.repeat)
+
+    # Lazy mode, a query right after every camera published a new frame
+    def ingest_and_query():
+        ingest_all(lazy)
+        lazy.get_part_pose_from_sensor(part_type, part_color)
+
+    results["lazy[ingest all + first query]"] = measure(ingest_and_query, args.number, args.repeat)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "config": {
+            "cameras": args.cameras,
+            "parts": args.parts,
+            "trays": args.trays,
+            "variants": args.variants,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    '''
+    Print the median timings of two result files side by side.
+    '''
+    print(f"{'benchmark':40s} {'baseline us':>12s} {'current us':>12s} {'ratio':>8s}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:40s} {'-':>12s} {result['median_us']:12.2f} {'-':>8s}")
+            continue
+        ratio = result["median_us"] / base["median_us"] if base["median_us"] else float("nan")
+        print(f"{name:40s} {base['median_us']:12.2f} {result['median_us']:12.2f} {ratio:8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=8, help="number of synthetic cameras")
+    parser.add_argument("--parts", type=int, default=9, help="parts per frame")
+    parser.add_argument("--trays", type=int, default=2, help="trays per frame")
+    parser.add_argument("--variants", type=int, default=4, help="distinct frames generated per camera")
+    parser.add_argument("--number", type=int, default=200, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="timings per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+    elif not args.output:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
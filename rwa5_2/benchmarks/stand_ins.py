@@ -0,0 +1,169 @@
+'''
+Stand-in ROS modules and message classes for the benchmarks.
+
+install() registers lightweight replacements of the rclpy, ariac_msgs,
+geometry_msgs, robot_commander_msgs and launch_ros modules that the
+perception code imports, so that utils.py and sensor_read.py can be loaded
+and timed without a ROS installation or a running graph.
+'''
+import os
+import sys
+import types
+
+
+class Point():
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+class Quaternion():
+    __slots__ = ("x", "y", "z", "w")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        self.x, self.y, self.z, self.w = x, y, z, w
+
+
+class Pose():
+    __slots__ = ("position", "orientation")
+
+    def __init__(self):
+        self.position = Point()
+        self.orientation = Quaternion()
+
+
+class Part():
+    RED, GREEN, BLUE, ORANGE, PURPLE = 0, 1, 2, 3, 4
+    BATTERY, PUMP, SENSOR, REGULATOR = 10, 11, 12, 13
+    __slots__ = ("color", "type")
+
+    def __init__(self, color=0, type=0):
+        self.color, self.type = color, type
+
+
+class PartPose():
+    __slots__ = ("part", "pose")
+
+    def __init__(self):
+        self.part = Part()
+        self.pose = Pose()
+
+
+class KitTrayPose():
+    __slots__ = ("id", "pose")
+
+    def __init__(self):
+        self.id = 0
+        self.pose = Pose()
+
+
+class AdvancedLogicalCameraImage():
+    __slots__ = ("part_poses", "tray_poses", "sensor_pose")
+
+    def __init__(self):
+        self.part_poses = []
+        self.tray_poses = []
+        self.sensor_pose = Pose()
+
+
+class Order():
+    KITTING, ASSEMBLY, COMBINED = 0, 1, 2
+
+
+class _Message():
+    '''
+    Placeholder for the message classes that are imported but not used by the benchmarks.
+    '''
+
+
+class QoSProfile():
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class DurabilityPolicy():
+    VOLATILE, TRANSIENT_LOCAL = 2, 1
+
+
+class LoggingSeverity():
+    DEBUG, INFO, WARN, ERROR, FATAL = 10, 20, 30, 40, 50
+
+
+class Logger():
+    '''
+    Logger that drops everything below WARN, like a node running quietly.
+    '''
+
+    def is_enabled_for(self, severity):
+        return severity >= LoggingSeverity.WARN
+
+    def info(self, message):
+        pass
+
+    def warn(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+
+class Node():
+    '''
+    Node stand-in, subscriptions are recorded but never spun.
+    '''
+
+    def __init__(self):
+        self.subscriptions = {}
+        self._logger = Logger()
+
+    def create_subscription(self, msg_type, topic, callback, qos_profile, callback_group=None):
+        self.subscriptions[topic] = callback
+        return callback
+
+    def get_logger(self):
+        return self._logger
+
+
+class FindPackageShare():
+    '''
+    Resolves the rwa5_2 share directory to the source tree.
+    '''
+
+    def __init__(self, package):
+        self.package = package
+
+    def find(self, package):
+        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install():
+    '''
+    Register the stand-in modules and put the rwa5_2 sources on the path.
+    '''
+    _module("rclpy")
+    _module("rclpy.qos", qos_profile_sensor_data=None, QoSProfile=QoSProfile, DurabilityPolicy=DurabilityPolicy)
+    _module("rclpy.logging", LoggingSeverity=LoggingSeverity)
+    _module("ariac_msgs")
+    _module("ariac_msgs.msg",
+            Order=Order, AGVStatus=_Message, AssemblyTask=_Message, Part=Part,
+            PartPose=PartPose, KitTrayPose=KitTrayPose,
+            AdvancedLogicalCameraImage=AdvancedLogicalCameraImage,
+            BasicLogicalCameraImage=_Message)
+    _module("geometry_msgs")
+    _module("geometry_msgs.msg", Pose=Pose, PoseStamped=_Message, Vector3=_Message, Quaternion=Quaternion)
+    _module("robot_commander_msgs")
+    _module("robot_commander_msgs.msg", LogicalCameraLabels=_Message)
+    _module("launch_ros")
+    _module("launch_ros.substitutions", FindPackageShare=FindPackageShare)
+
+    sources = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rwa5_2")
+    if sources not in sys.path:
+        sys.path.insert(0, sources)
@@ -1,7 +1,9 @@
 from launch import LaunchDescription
 from launch_ros.actions import Node
 from launch.launch_description_sources import PythonLaunchDescriptionSource
-from launch.actions import IncludeLaunchDescription
+from launch.actions import IncludeLaunchDescription, DeclareLaunchArgument
+from launch.conditions import IfCondition, UnlessCondition
+from launch.substitutions import LaunchConfiguration
 from launch_ros.substitutions import FindPackageShare
 # from ariac_moveit_config.parameters import generate_parameters
 
@@ -14,12 +16,39 @@ def generate_launch_description():
         LaunchDescription: The LaunchDescription instance.
     '''
     ld = LaunchDescription()
-    # Interface node
+    # batched:=true runs both bin cameras through one model in yolo_batch_server.py,
+    # batched:=false starts one YOLO node per bin camera
+    batched_arg = DeclareLaunchArgument("batched", default_value="true")
+    batched = LaunchConfiguration("batched")
+    # headless:=true draws nothing in the image callbacks and opens no window, annotated
+    # images are published on ~/<camera>/debug_image at debug_image_rate Hz (0 disables them)
+    headless_arg = DeclareLaunchArgument("headless", default_value="true")
+    debug_image_rate_arg = DeclareLaunchArgument("debug_image_rate", default_value="1.0")
+    # backend:=onnx runs the ONNX export of the weights (detectors.export_onnx) with onnxruntime
+    backend_arg = DeclareLaunchArgument("backend", default_value="ultralytics")
+    perception_parameters = {
+        "backend": LaunchConfiguration("backend"),
+        "headless": LaunchConfiguration("headless"),
+        "debug_image_rate": LaunchConfiguration("debug_image_rate"),
+        # The RGB header stamps are simulation time, the logical camera frames are stamped on reception
+        "use_sim_time": True,
+    }
+
+    batch_server = Node(
+        package="rwa5_2",
+        executable="yolo_batch_server.py",
+        name="yolo_batch_server",
+        output="screen",
+        parameters=[perception_parameters],
+        condition=IfCondition(batched),
+    )
     final_yolo1 = Node(
         package="rwa5_2",
         executable="yolo_combined.py",
         name="image_subscriber_7",
         output="screen",
+        parameters=[perception_parameters],
+        condition=UnlessCondition(batched),
         # parameters=generate_parameters()
     )
     final_yolo2 = Node(
@@ -27,6 +56,8 @@ def generate_launch_description():
     executable="yolonode_leftbin.py",
     name="image_subscriber_2",
     output="screen",
+    parameters=[perception_parameters],
+    condition=UnlessCondition(batched),
     # parameters=generate_parameters()
     )
     final_yolo3 = Node(
@@ -34,6 +65,7 @@ def generate_launch_description():
     executable="yolonode_tray1.py",
     name="image_subscriber_3",
     output="screen",
+    parameters=[perception_parameters],
     # parameters=generate_parameters()
     )
     final_yolo4 = Node(
@@ -41,9 +73,15 @@ def generate_launch_description():
     executable="yolonode_tray2.py",
     name="image_subscriber_4",
     output="screen",
+    parameters=[perception_parameters],
     # parameters=generate_parameters()
     )
     
+    ld.add_action(batched_arg)
+    ld.add_action(headless_arg)
+    ld.add_action(debug_image_rate_arg)
+    ld.add_action(backend_arg)
+    ld.add_action(batch_server)
     ld.add_action(final_yolo1)
     ld.add_action(final_yolo2)
     ld.add_action(final_yolo3)
@@ -0,0 +1,39 @@
+from launch import LaunchDescription
+from launch_ros.actions import Node
+from launch.actions import DeclareLaunchArgument
+from launch.substitutions import LaunchConfiguration
+
+
+def generate_launch_description():
+    '''
+    Generates a LaunchDescription for launching the ARIAC interface and all the perception
+    nodes in one process, in place of ariac_interface.launch.py and ariac_yolo.launch.py.
+
+    Returns:
+        LaunchDescription: The LaunchDescription instance.
+    '''
+    ld = LaunchDescription()
+    # Same arguments as ariac_yolo.launch.py, the bin cameras always share the batch server
+    headless_arg = DeclareLaunchArgument("headless", default_value="true")
+    debug_image_rate_arg = DeclareLaunchArgument("debug_image_rate", default_value="1.0")
+    backend_arg = DeclareLaunchArgument("backend", default_value="ultralytics")
+    perception_parameters = {
+        "backend": LaunchConfiguration("backend"),
+        "headless": LaunchConfiguration("headless"),
+        "debug_image_rate": LaunchConfiguration("debug_image_rate"),
+    }
+
+    # No name here, it would rename every node of the process. The parameters apply to all
+    # the nodes, use_sim_time is set by the container on the perception nodes only.
+    container = Node(
+        package="rwa5_2",
+        executable="perception_container.py",
+        output="screen",
+        parameters=[perception_parameters],
+    )
+
+    ld.add_action(headless_arg)
+    ld.add_action(debug_image_rate_arg)
+    ld.add_action(backend_arg)
+    ld.add_action(container)
+    return ld  # Return LaunchDescription instance
@@ -16,7 +16,6 @@ from custom_timer import CustomTimer
 from comp_state import CompetitionState
 from read_store_orders import ReadStoreOrders
 # from ship_orders import ShipOrders
-from utils import RPY_to_Quart
 
 # from submit_orders import OrderSubmission  
 from submit_orders import ShipAndOrderSubmission
@@ -79,7 +78,7 @@ class AriacInterface(Node):
         # self.ship_order = ShipOrders(self,group_reentrant1)
         #Read and store order object instance
         self.read_store_orders=ReadStoreOrders(self,AriacInterface.order_topic1,self.order_queue,callback_group=group_reentrant1)
-        self.sensor_read=SensorRead(self,callback_group=group_reentrant1)
+        self.sensor_read=SensorRead(self,callback_group=group_reentrant1,lazy=True)
         
         self.current_order_priority = False
         self.current_order = None
@@ -210,7 +209,7 @@ class AriacInterface(Node):
 
         if len(self.order_queue)>0:
             try:
-                   order = self.order_queue.popleft()
+                order = self.order_queue.popleft()
                 # if len(self.current_order)==0:
                 self.update_order(order)
             except Exception as e:
@@ -0,0 +1,120 @@
+'''
+Projection of the logical camera detections into the image of the RGB camera next to it.
+
+The poses of both cameras come from the sensor YAML file and the intrinsics
+of the RGB camera from config/camera_intrinsics.yaml. The logical-to-RGB
+transform is composed once per camera, so projecting the parts of a frame
+is one matrix product and a division.
+'''
+import os
+
+import numpy as np
+import yaml
+
+import pose_kernels as PK
+from sensor_transforms import yaml_pose_to_array
+
+
+def load_config(name: str) -> dict:
+    '''
+    Load a YAML file of the config folder of the package.
+
+    Args:
+        name (str): Name of the file without extension, e.g. "new_sensors"
+
+    Returns:
+        dict: Content of the file
+    '''
+    # Imported here so that the module is usable without a ROS installation
+    from launch_ros.substitutions import FindPackageShare
+
+    pkg_share = FindPackageShare(package='rwa5_2').find('rwa5_2')
+    with open(os.path.join(pkg_share, 'config', name + ".yaml"), 'r') as file:
+        return yaml.safe_load(file)
+
+
+class CameraProjection():
+    '''
+    Pinhole projection of points given in a logical camera frame to the pixels of an RGB camera.
+    '''
+
+    def __init__(self, logical_pose, rgb_pose, intrinsics: dict, scale: float = 1.0):
+        '''
+        Args:
+            logical_pose (array_like): (7,) world pose of the logical camera
+            rgb_pose (array_like): (7,) world pose of the RGB camera
+            intrinsics (dict): fx, fy, cx, cy of the RGB camera in pixels
+            scale (float): Scale of the image the pixels refer to, e.g. 4 for an image upscaled 4 times
+        '''
+        # Logical camera frame to RGB camera frame
+        transform = np.linalg.inv(PK.pose_to_matrix(rgb_pose)) @ PK.pose_to_matrix(logical_pose)
+        self._rotation = transform[:3, :3].copy()
+        self._translation = transform[:3, 3].copy()
+        self._fx = intrinsics["fx"] * scale
+        self._fy = intrinsics["fy"] * scale
+        self._cx = intrinsics["cx"] * scale
+        self._cy = intrinsics["cy"] * scale
+
+    @classmethod
+    def from_config(cls, camera_name: str, sensors_config: dict, intrinsics_config: dict, scale: float = 1.0):
+        '''
+        Build the projection of a camera from the sensor and intrinsics configurations.
+
+        Args:
+            camera_name (str): Name of the RGB camera, its logical camera being "<camera_name>_logical"
+            sensors_config (dict): The "sensors" mapping of the sensor YAML file
+            intrinsics_config (dict): Content of camera_intrinsics.yaml
+            scale (float): Scale of the image the pixels refer to
+
+        Returns:
+            CameraProjection: The projection
+        '''
+        intrinsics = intrinsics_config.get(camera_name, intrinsics_config["default"])
+        return cls(
+            yaml_pose_to_array(sensors_config[camera_name + "_logical"]["pose"]),
+            yaml_pose_to_array(sensors_config[camera_name]["pose"]),
+            intrinsics,
+            scale)
+
+    def project(self, points) -> np.ndarray:
+        '''
+        Project points to pixels.
+
+        Args:
+            points (array_like): (N, 3) positions in the logical camera frame
+
+        Returns:
+            np.ndarray: (N, 2) pixel coordinates (column, row), NaN for the points behind the camera
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        camera = points @ self._rotation.T + self._translation
+        depth = camera[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse_depth = np.where(depth > 0.0, 1.0 / depth, np.nan)
+        pixels = np.empty((len(points), 2))
+        pixels[:, 0] = self._cx - self._fx * camera[:, 1] * inverse_depth
+        pixels[:, 1] = self._cy - self._fy * camera[:, 2] * inverse_depth
+        return pixels
+
+    def box(self, center, half_size: float, shape):
+        '''
+        Pixel box of a square of the image plane of the logical camera, clipped to the image.
+
+        Args:
+            center (array_like): (3,) center of the square in the logical camera frame
+            half_size (float): Half size (m) of the square, along the y and z axes of the logical camera
+            shape (Tuple[int, int]): Height and width of the image
+
+        Returns:
+            Tuple[int, int, int, int]: x1, y1, x2, y2, None if the box is outside the image or behind the camera
+        '''
+        x, y, z = center
+        corners = self.project([(x, y + dy, z + dz) for dy in (-half_size, half_size) for dz in (-half_size, half_size)])
+        if np.isnan(corners).any():
+            return None
+        height, width = shape[:2]
+        x1, y1 = np.clip(np.floor(corners.min(axis=0)).astype(int), 0, (width, height))
+        x2, y2 = np.clip(np.ceil(corners.max(axis=0)).astype(int), 0, (width, height))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return (int(x1), int(y1), int(x2), int(y2))
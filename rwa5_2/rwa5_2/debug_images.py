@@ -0,0 +1,160 @@
+'''
+Annotated debug images of the perception nodes, published off the hot path.
+
+In headless mode the image callbacks do not draw anything. They only hand the
+frame and what was detected in it to a DebugImagePublisher, which copies a
+frame at a low rate and, from its own thread, draws the annotations on the
+copy and publishes it as a sensor_msgs/Image. Nothing is copied or drawn
+while no one subscribes to the debug topic.
+'''
+import threading
+import time
+
+import cv2
+from cv_bridge import CvBridge
+from sensor_msgs.msg import Image
+
+
+def declare_display_parameters(node):
+    '''
+    Declare the display parameters shared by the perception nodes.
+
+    Parameters:
+        headless -- If True, nothing is drawn in the image callbacks and no window is opened
+        debug_image_rate -- Rate (Hz) of the annotated debug images in headless mode, 0 to disable them
+
+    Args:
+        node (Node): The node
+
+    Returns:
+        Tuple[bool, float]: headless, debug_image_rate
+    '''
+    headless = node.declare_parameter("headless", False).value
+    debug_image_rate = node.declare_parameter("debug_image_rate", 1.0).value
+    return headless, debug_image_rate
+
+
+class DebugImagePublisher():
+    '''
+    Throttled publisher of annotated images running in its own thread.
+    '''
+
+    def __init__(self, node, topic: str, rate: float):
+        '''
+        Create the publisher and start the thread.
+
+        Args:
+            node (Node): Node creating the publisher
+            topic (str): Topic of the debug images
+            rate (float): Maximum number of images published per second
+        '''
+        self._publisher = node.create_publisher(Image, topic, 1)
+        self._bridge = CvBridge()
+        self._period = 1.0 / rate
+        self._next_copy = 0.0
+        self._lock = threading.Lock()
+        # Latest (image, draw) submitted and not yet published
+        self._pending = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"debug_image{topic}", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, draw):
+        '''
+        Offer a frame for the next debug image, replacing any frame not yet published.
+
+        The frame is only copied when a debug image is due, at most rate times
+        per second, and the caller may reuse it afterwards.
+
+        Args:
+            image (np.ndarray): BGR frame
+            draw (Callable[[np.ndarray], None]): Draws the annotations on the copy of the frame
+        '''
+        if not self.due():
+            return
+        self._next_copy = time.monotonic() + self._period
+        copy = image.copy()
+        with self._lock:
+            self._pending = (copy, draw)
+
+    def due(self) -> bool:
+        '''
+        Returns:
+            bool: True if the next frame submitted would be copied
+        '''
+        return time.monotonic() >= self._next_copy and self._publisher.get_subscription_count() > 0
+
+    def close(self):
+        '''
+        Stop the thread.
+        '''
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self._period):
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                continue
+            annotated, draw = pending
+            draw(annotated)
+            self._publisher.publish(self._bridge.cv2_to_imgmsg(annotated, "bgr8"))
+
+
+class FrameDisplay():
+    '''
+    Output of the annotated frames of one camera.
+
+    With a display, the annotations are drawn on the frame and shown in a
+    window. In headless mode, the frame is handed to a DebugImagePublisher
+    instead, or dropped if the debug images are disabled.
+    '''
+
+    def __init__(self, node, camera_name: str, headless: bool, debug_image_rate: float):
+        '''
+        Args:
+            node (Node): Node owning the display
+            camera_name (str): Name of the camera, used for the window and the debug topic
+            headless (bool): If True, no window is opened
+            debug_image_rate (float): Rate (Hz) of the debug images in headless mode, 0 to disable them
+        '''
+        self.camera_name = camera_name
+        self.headless = headless
+        self._debug_images = None
+        if headless and debug_image_rate > 0:
+            self._debug_images = DebugImagePublisher(node, f"~/{camera_name}/debug_image", debug_image_rate)
+
+    def wants_frame(self) -> bool:
+        '''
+        Tell if show would use a frame now, so callers can skip preparing one.
+
+        Returns:
+            bool: True with a window, or when a debug image is due
+        '''
+        if not self.headless:
+            return True
+        return self._debug_images is not None and self._debug_images.due()
+
+    def show(self, image, draw):
+        '''
+        Output one frame.
+
+        Args:
+            image (np.ndarray): BGR frame, possibly read-only, the annotations are drawn on a copy
+            draw (Callable[[np.ndarray], None]): Draws the annotations on a frame
+        '''
+        if not self.headless:
+            image = image.copy()
+            draw(image)
+            cv2.imshow(self.camera_name, image)
+            cv2.waitKey(1)
+        elif self._debug_images is not None:
+            self._debug_images.submit(image, draw)
+
+    def close(self):
+        '''
+        Stop the debug image thread, if any.
+        '''
+        if self._debug_images is not None:
+            self._debug_images.close()
@@ -0,0 +1,55 @@
+import numpy as np
+
+# Value of the assignment of a point left without a target
+UNASSIGNED = -1
+
+
+def greedy_assignment(points, targets, max_distance: float = np.inf) -> np.ndarray:
+    '''
+    One-to-one assignment of points to targets, greedy by distance.
+
+    The closest point-target pair is assigned first, then the closest pair
+    among the remaining points and targets, and so on. Pairs further apart
+    than max_distance are never assigned. Instead of sorting every pair, each
+    round assigns all the pairs that are mutually nearest among what remains,
+    which are exactly the pairs the greedy order would pick next, so a frame
+    usually takes one or two rounds of vectorized operations.
+
+    Args:
+        points (array_like): (M, D) or (M,) coordinates of the points
+        targets (array_like): (N, D) or (N,) coordinates of the targets
+        max_distance (float): Maximum distance between a point and its target
+
+    Returns:
+        np.ndarray: (M,) index of the target of every point, UNASSIGNED if none
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    assignment = np.full(len(points), UNASSIGNED, dtype=np.intp)
+    if not len(points) or not len(targets):
+        return assignment
+    points = points.reshape(len(points), -1)
+    targets = targets.reshape(len(targets), -1)
+
+    # (M, N) distance matrix, pairs beyond the gate or with NaN coordinates can not be assigned
+    cost = np.linalg.norm(points[:, None, :] - targets[None, :, :], axis=2)
+    cost[~(cost <= max_distance)] = np.inf
+
+    rows = np.arange(len(points))
+    cols = np.arange(len(targets))
+    while rows.size and cols.size:
+        sub = cost[np.ix_(rows, cols)]
+        best_col = sub.argmin(axis=1)
+        best_row = sub.argmin(axis=0)
+        local_rows = np.arange(len(rows))
+        mutual = np.isfinite(sub[local_rows, best_col]) & (best_row[best_col] == local_rows)
+        if not mutual.any():
+            # Only pairs beyond the gate are left
+            break
+        assignment[rows[mutual]] = cols[best_col[mutual]]
+
+        free_cols = np.ones(len(cols), dtype=bool)
+        free_cols[best_col[mutual]] = False
+        rows = rows[~mutual]
+        cols = cols[free_cols]
+    return assignment
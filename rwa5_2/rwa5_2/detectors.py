@@ -0,0 +1,417 @@
+'''
+Inference backends of the YOLO nodes.
+
+A detector takes a list of BGR images and returns, for every image, the
+(N, 4) boxes x1, y1, x2, y2 in pixels of the image, the (N,) confidences and
+the (N,) class ids, so the nodes do not depend on the backend:
+
+- UltralyticsDetector runs the PyTorch weights through ultralytics.
+- OnnxDetector runs a model exported to ONNX (see export_onnx) on the CPU
+  with onnxruntime, at the fixed input size of the export, with the input
+  tensor allocated once. The export can be quantized to INT8.
+
+A classifier takes a list of BGR crops and returns the (N,) class ids and
+(N,) confidences of their top class, with the same class ids as the
+detectors (yolo_common.CLASS_NAMES), from YOLO classification weights run
+by ultralytics (UltralyticsClassifier) or exported to ONNX (OnnxClassifier).
+'''
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Gray level of the letterbox padding, as in ultralytics
+PAD_VALUE = 114
+
+# Offset between the boxes of two classes, so that one NMS call never suppresses across classes
+CLASS_OFFSET = 7680.0
+
+
+def load_model(model_path: str):
+    '''
+    Load the YOLO model.
+
+    Args:
+        model_path (str): Path of the weights
+
+    Returns:
+        YOLO: The model
+    '''
+    # Imported here so that the rest of the module is usable without ultralytics
+    from ultralytics import YOLO
+    return YOLO(model_path)
+
+
+def result_to_arrays(result):
+    '''
+    Convert the boxes of one ultralytics result to plain arrays.
+
+    Args:
+        result (Results): Result of the model for one image
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (N, 4) boxes x1, y1, x2, y2, (N,) confidences and (N,) class ids
+    '''
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int))
+
+
+def nms(boxes, scores, iou_threshold: float, max_detections: int = 300) -> np.ndarray:
+    '''
+    Non-maximum suppression.
+
+    Args:
+        boxes (np.ndarray): (N, 4) boxes x1, y1, x2, y2
+        scores (np.ndarray): (N,) scores
+        iou_threshold (float): Overlap from which the box with the lower score is suppressed
+        max_detections (int): Maximum number of boxes kept
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, highest score first
+    '''
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size and len(keep) < max_detections:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0.0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0.0, None)
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
+
+
+class UltralyticsDetector():
+    '''
+    Detector running the PyTorch weights through ultralytics.
+    '''
+
+    def __init__(self, model_path: str):
+        '''
+        Args:
+            model_path (str): Path of the .pt weights
+        '''
+        self.model = load_model(model_path)
+
+    def __call__(self, images: list) -> list:
+        '''
+        Args:
+            images (List[np.ndarray]): BGR images, run as one batch
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray, np.ndarray]]: Boxes, confidences and class ids of every image
+        '''
+        return [result_to_arrays(result) for result in self.model(images, verbose=False)]
+
+
+class OnnxDetector():
+    '''
+    Detector running an exported YOLO model with onnxruntime on the CPU.
+
+    The images are letterboxed to the fixed input size of the model in a
+    preallocated canvas and written into a preallocated input tensor, so a
+    frame only allocates the resized image and the outputs of the session.
+    '''
+
+    def __init__(self, model_path: str, input_size: int = 640, conf_threshold: float = 0.25,
+                 iou_threshold: float = 0.7, num_threads: int = 0):
+        '''
+        Args:
+            model_path (str): Path of the .onnx model
+            input_size (int): Side of the square input, used when the model has a dynamic input shape
+            conf_threshold (float): Minimum confidence of a detection, as the conf argument of ultralytics
+            iou_threshold (float): Overlap threshold of the NMS, as the iou argument of ultralytics
+            num_threads (int): Threads of the session, 0 to let onnxruntime decide
+        '''
+        # Imported here so that the module is usable without onnxruntime
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        height, width = model_input.shape[2:]
+        self.input_size = (height if isinstance(height, int) else input_size,
+                           width if isinstance(width, int) else input_size)
+        self._conf_threshold = conf_threshold
+        self._iou_threshold = iou_threshold
+
+        self._canvas = np.full(self.input_size + (3,), PAD_VALUE, dtype=np.uint8)
+        self._input = np.empty((1, 3) + self.input_size, dtype=np.float32)
+        # Image shape -> (scale, left, top, resized buffer) of the letterbox
+        self._letterbox = {}
+        # Image shape the padding of the canvas was drawn for
+        self._canvas_shape = None
+
+    def _letterbox_geometry(self, shape):
+        geometry = self._letterbox.get(shape)
+        if geometry is None:
+            height, width = shape
+            scale = min(self.input_size[0] / height, self.input_size[1] / width)
+            resized = np.empty((round(height * scale), round(width * scale), 3), dtype=np.uint8)
+            top = (self.input_size[0] - resized.shape[0]) // 2
+            left = (self.input_size[1] - resized.shape[1]) // 2
+            geometry = self._letterbox[shape] = (scale, left, top, resized)
+        return geometry
+
+    def _preprocess(self, image):
+        '''
+        Letterbox a BGR image into the input tensor.
+
+        Returns:
+            Tuple[float, int, int]: Scale and left and top padding of the letterbox
+        '''
+        scale, left, top, resized = self._letterbox_geometry(image.shape[:2])
+        if self._canvas_shape != image.shape[:2]:
+            # The padding only changes with the image shape
+            self._canvas[...] = PAD_VALUE
+            self._canvas_shape = image.shape[:2]
+        cv2.resize(image, resized.shape[1::-1], dst=resized, interpolation=cv2.INTER_LINEAR)
+        self._canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+        # BGR HWC uint8 to RGB CHW float in [0, 1]
+        np.multiply(self._canvas[..., ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=self._input[0], casting="unsafe")
+        return scale, left, top
+
+    def _postprocess(self, output, shape, scale, left, top):
+        '''
+        Boxes of one image from the (4 + classes, anchors) output of the model.
+        '''
+        predictions = output.T
+        scores = predictions[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf > self._conf_threshold
+        predictions, cls, conf = predictions[keep], cls[keep], conf[keep]
+
+        xyxy = np.empty((len(predictions), 4), dtype=np.float32)
+        xyxy[:, :2] = predictions[:, :2] - predictions[:, 2:4] / 2.0
+        xyxy[:, 2:] = predictions[:, :2] + predictions[:, 2:4] / 2.0
+        kept = nms(xyxy + (cls * CLASS_OFFSET)[:, None], conf, self._iou_threshold)
+        xyxy, conf, cls = xyxy[kept], conf[kept], cls[kept]
+
+        # Back to the pixels of the image
+        xyxy -= (left, top, left, top)
+        xyxy /= scale
+        np.clip(xyxy, 0.0, (shape[1], shape[0], shape[1], shape[0]), out=xyxy)
+        return xyxy, conf, cls.astype(int)
+
+    def __call__(self, images: list) -> list:
+        '''
+        Args:
+            images (List[np.ndarray]): BGR images, run one at a time at the fixed input size
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray, np.ndarray]]: Boxes, confidences and class ids of every image
+        '''
+        detections = []
+        for image in images:
+            scale, left, top = self._preprocess(image)
+            output = self._session.run(None, {self._input_name: self._input})[0]
+            detections.append(self._postprocess(output[0], image.shape[:2], scale, left, top))
+        return detections
+
+
+class UltralyticsClassifier():
+    '''
+    Classifier running YOLO classification weights through ultralytics.
+
+    Calls are serialized, one classifier serves the pipelines of several cameras.
+    '''
+
+    def __init__(self, model_path: str):
+        '''
+        Args:
+            model_path (str): Path of the .pt weights
+        '''
+        self.model = load_model(model_path)
+        self._lock = threading.Lock()
+
+    def __call__(self, crops: list) -> tuple:
+        '''
+        Args:
+            crops (List[np.ndarray]): BGR crops, run as one batch
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (N,) class ids and (N,) confidences
+        '''
+        with self._lock:
+            results = self.model(crops, verbose=False)
+        return (np.array([result.probs.top1 for result in results], dtype=int),
+                np.array([float(result.probs.top1conf) for result in results]))
+
+
+class OnnxClassifier():
+    '''
+    Classifier running exported YOLO classification weights with onnxruntime on the CPU.
+
+    The crops are resized to the square input of the model into a batch
+    tensor that is only reallocated when a call has more crops than ever.
+    Models exported with a fixed batch size are run one crop at a time.
+    Calls are serialized, as they share these buffers and one classifier
+    serves the pipelines of several cameras.
+    '''
+
+    def __init__(self, model_path: str, input_size: int = 64, num_threads: int = 0):
+        '''
+        Args:
+            model_path (str): Path of the .onnx model, with softmax probabilities as output
+            input_size (int): Side of the square input, used when the model has a dynamic input shape
+            num_threads (int): Threads of the session, 0 to let onnxruntime decide
+        '''
+        # Imported here so that the module is usable without onnxruntime
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        self._fixed_batch = batch if isinstance(batch, int) else None
+        self.input_size = (height if isinstance(height, int) else input_size,
+                           width if isinstance(width, int) else input_size)
+        self._input = np.empty((self._fixed_batch or 1, 3) + self.input_size, dtype=np.float32)
+        self._resized = np.empty(self.input_size + (3,), dtype=np.uint8)
+        self._lock = threading.Lock()
+
+    def __call__(self, crops: list) -> tuple:
+        '''
+        Args:
+            crops (List[np.ndarray]): BGR crops
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (N,) class ids and (N,) confidences
+        '''
+        with self._lock:
+            return self._classify(crops)
+
+    def _classify(self, crops: list) -> tuple:
+        '''
+        Classify the crops, the caller holds the lock.
+        '''
+        if self._fixed_batch is None and len(crops) > len(self._input):
+            self._input = np.empty((len(crops), 3) + self.input_size, dtype=np.float32)
+
+        probabilities = []
+        step = self._fixed_batch or len(crops)
+        for start in range(0, len(crops), step):
+            batch = crops[start:start + step]
+            for row, crop in enumerate(batch):
+                cv2.resize(crop, self.input_size[::-1], dst=self._resized, interpolation=cv2.INTER_LINEAR)
+                # BGR HWC uint8 to RGB CHW float in [0, 1]
+                np.multiply(self._resized[..., ::-1].transpose(2, 0, 1), 1.0 / 255.0,
+                            out=self._input[row], casting="unsafe")
+            tensor = self._input if self._fixed_batch else self._input[:len(batch)]
+            probabilities.append(self._session.run(None, {self._input_name: tensor})[0][:len(batch)])
+
+        if not probabilities:
+            return np.empty(0, dtype=int), np.empty(0)
+        probabilities = np.concatenate(probabilities)
+        cls = probabilities.argmax(axis=1)
+        return cls, probabilities[np.arange(len(cls)), cls]
+
+
+def export_onnx(model_path: str, input_size: int = 640, int8: bool = False, calibration_images=None) -> str:
+    '''
+    Export YOLO weights to ONNX for OnnxDetector, next to the weights.
+
+    INT8 quantization is static when calibration images are given, the
+    activation ranges being measured on them, and dynamic otherwise. Check
+    the latency and the labels of the quantized model with
+    benchmarks/bench_detectors.py before using it, dynamic quantization of
+    convolutions is not always faster.
+
+    Args:
+        model_path (str): Path of the .pt weights
+        input_size (int): Side of the square input of the exported model
+        int8 (bool): Also quantize the model to INT8
+        calibration_images (List[np.ndarray]): BGR images representative of the cameras
+
+    Returns:
+        str: Path of the exported model, the INT8 one if int8 is set
+    '''
+    onnx_path = load_model(model_path).export(format="onnx", imgsz=input_size, dynamic=False, simplify=True)
+    if not int8:
+        return onnx_path
+
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_dynamic, quantize_static
+
+    int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    if not calibration_images:
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        return int8_path
+
+    class Calibration(CalibrationDataReader):
+        def __init__(self):
+            self._detector = OnnxDetector(onnx_path, input_size)
+            self._images = iter(calibration_images)
+
+        def get_next(self):
+            image = next(self._images, None)
+            if image is None:
+                return None
+            self._detector._preprocess(image)
+            return {self._detector._input_name: self._detector._input.copy()}
+
+    quantize_static(onnx_path, int8_path, Calibration(), weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8)
+    return int8_path
+
+
+def load_classifier(backend: str, model_path: str, num_threads: int = 0):
+    '''
+    Load the classifier of a backend.
+
+    Args:
+        backend (str): "ultralytics" or "onnx"
+        model_path (str): Path of the classification model, for "onnx" a .pt path stands for the .onnx export next to it
+        num_threads (int): Threads of the "onnx" backend, 0 to let onnxruntime decide
+
+    Returns:
+        UltralyticsClassifier | OnnxClassifier: The classifier
+
+    Raises:
+        FileNotFoundError: The classification weights do not exist, the repository does not ship them
+    '''
+    if backend not in ("ultralytics", "onnx"):
+        raise ValueError(f"Unknown inference backend {backend}")
+    if backend == "onnx" and model_path.endswith(".pt"):
+        model_path = os.path.splitext(model_path)[0] + ".onnx"
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(
+            f"Classification weights {model_path} not found. They are not part of the repository: train YOLO "
+            "classification weights on bin slot crops with the classes of yolo_common.CLASS_NAMES, in that order, "
+            "export them to ONNX for the onnx backend, and set the classifier_path parameter")
+    if backend == "ultralytics":
+        return UltralyticsClassifier(model_path)
+    return OnnxClassifier(model_path, num_threads=num_threads)
+
+
+def load_detector(backend: str, model_path: str, input_size: int = 640, num_threads: int = 0):
+    '''
+    Load the detector of a backend.
+
+    Args:
+        backend (str): "ultralytics" or "onnx"
+        model_path (str): Path of the model, for "onnx" a .pt path stands for the .onnx export next to it
+        input_size (int): Input size of the "onnx" backend when the model has a dynamic input shape
+        num_threads (int): Threads of the "onnx" backend, 0 to let onnxruntime decide
+
+    Returns:
+        UltralyticsDetector | OnnxDetector: The detector
+    '''
+    if backend == "ultralytics":
+        return UltralyticsDetector(model_path)
+    if backend == "onnx":
+        if model_path.endswith(".pt"):
+            model_path = os.path.splitext(model_path)[0] + ".onnx"
+        return OnnxDetector(model_path, input_size, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend {backend}")
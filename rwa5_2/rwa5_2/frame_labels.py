@@ -0,0 +1,82 @@
+'''
+Compact labels of the basic logical camera frames published by the perception nodes.
+
+The perception nodes used to rebuild every basic logical camera frame as an
+AdvancedLogicalCameraImage, pose by pose, and publish it for every frame.
+SensorRead receives the logical camera frames itself, so only the labels of
+a frame and the indices of the labeled parts and trays are published, and
+only when they change. SensorRead joins them with the frame of the same
+sensor_store.frame_key. The topic keeps the last labels for the subscribers
+that join later, as they are not published again while nothing changes.
+'''
+from rclpy.qos import QoSProfile, DurabilityPolicy
+from robot_commander_msgs.msg import LogicalCameraLabels
+
+from sensor_store import frame_key
+
+# Latched topic, the last labels are delivered to late subscribers
+LABELS_QOS = QoSProfile(depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL)
+
+
+def labels_topic(sensor_name: str) -> str:
+    '''
+    Topic of the labels of a basic logical camera.
+
+    Args:
+        sensor_name (str): Name of the logical camera, "<camera>_logical"
+
+    Returns:
+        str: The topic
+    '''
+    return f"/ariac/sensors/{sensor_name}/labels"
+
+
+class FrameLabeler():
+    '''
+    Labels messages of the frames of one logical camera, left out when identical to the last ones.
+    '''
+
+    def __init__(self):
+        # Key and labels of the last labels message
+        self._last = None
+
+        # Counters reported by the stats property
+        self._changed = 0
+        self._unchanged = 0
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Labeled frames whose labels changed and were left out as unchanged
+        '''
+        return {"changed": self._changed, "unchanged": self._unchanged}
+
+    def encode(self, frame, parts=(), trays=()) -> LogicalCameraLabels:
+        '''
+        Labels message of a frame.
+
+        Args:
+            frame (BasicLogicalCameraImage): The labeled frame
+            parts (Iterable[Tuple[int, int, int]]): Index in frame.part_poses, color and type of the labeled parts
+            trays (Iterable[Tuple[int, int]]): Index in frame.tray_poses and ID of the labeled trays
+
+        Returns:
+            LogicalCameraLabels: The labels, None if the frame and its labels did not change
+        '''
+        labels = (frame_key(frame), tuple(parts), tuple(trays))
+        if labels == self._last:
+            self._unchanged += 1
+            return None
+        self._last = labels
+        self._changed += 1
+
+        key, parts, trays = labels
+        msg = LogicalCameraLabels()
+        msg.frame_key = key
+        msg.part_indices = [index for index, _, _ in parts]
+        msg.part_colors = [color for _, color, _ in parts]
+        msg.part_types = [part_type for _, _, part_type in parts]
+        msg.tray_indices = [index for index, _ in trays]
+        msg.tray_ids = [tray_id for _, tray_id in trays]
+        return msg
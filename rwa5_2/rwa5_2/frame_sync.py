@@ -0,0 +1,306 @@
+'''
+Bounded per-frame buffers of the perception nodes, the approximate-time
+pairing of the logical camera frames with the RGB detections of the same
+camera, and the hand-off of the RGB frames to the inference threads.
+'''
+import threading
+from collections import deque
+
+
+def stamp_of(msg, clock) -> int:
+    '''
+    Stamp of a message in nanoseconds.
+
+    The header stamp is used when the message has a non-zero one. The logical
+    camera images have no header, they are stamped with the time of reception
+    on the node clock, which is the simulation clock when use_sim_time is set.
+
+    Args:
+        msg: The message
+        clock (Clock): Clock of the node receiving the message
+
+    Returns:
+        int: Stamp in nanoseconds
+    '''
+    header = getattr(msg, "header", None)
+    if header is not None and (header.stamp.sec or header.stamp.nanosec):
+        return header.stamp.sec * 1_000_000_000 + header.stamp.nanosec
+    return clock.now().nanoseconds
+
+
+class DetectionBuffer():
+    '''
+    Fixed-capacity buffer of per-frame entries, oldest first.
+
+    Entries are (stamp, item) pairs appended in stamp order. The oldest
+    entry is evicted when the buffer is full, and entries older than max_age
+    relative to the newest stamp seen are evicted on every append, so memory
+    and lookups stay bounded however long the node runs.
+    '''
+
+    def __init__(self, capacity: int = 5, max_age: float = 2.0):
+        '''
+        Args:
+            capacity (int): Maximum number of entries
+            max_age (float): Maximum age (s) of an entry relative to the newest stamp seen
+        '''
+        self.capacity = capacity
+        self._max_age = int(max_age * 1e9)
+        self._entries = deque()
+        self._newest = None
+
+        # Counters reported by the stats property
+        self._added = 0
+        self._evicted_capacity = 0
+        self._evicted_age = 0
+        self._peak = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Occupancy of the buffer and counters of added and evicted entries
+        '''
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "occupancy": len(self._entries) / self.capacity,
+            "peak": self._peak,
+            "added": self._added,
+            "evicted_capacity": self._evicted_capacity,
+            "evicted_age": self._evicted_age,
+        }
+
+    def append(self, stamp: int, item):
+        '''
+        Add the entry of a new frame.
+
+        Args:
+            stamp (int): Stamp of the frame in nanoseconds
+            item: The entry
+        '''
+        self.expire(stamp)
+        if len(self._entries) == self.capacity:
+            self._entries.popleft()
+            self._evicted_capacity += 1
+        self._entries.append((stamp, item))
+        self._added += 1
+        self._peak = max(self._peak, len(self._entries))
+
+    def expire(self, stamp: int):
+        '''
+        Evict the entries older than max_age relative to a stamp.
+
+        Args:
+            stamp (int): Current stamp in nanoseconds
+        '''
+        if self._newest is None or stamp > self._newest:
+            self._newest = stamp
+        limit = self._newest - self._max_age
+        while self._entries and self._entries[0][0] < limit:
+            self._entries.popleft()
+            self._evicted_age += 1
+
+    def popleft(self):
+        '''
+        Remove and return the oldest entry.
+
+        Returns:
+            Tuple[int, item]: (stamp, item)
+        '''
+        return self._entries.popleft()
+
+    def latest(self):
+        '''
+        Newest entry still in the buffer.
+
+        Returns:
+            item: The newest item, None if the buffer is empty
+        '''
+        return self._entries[-1][1] if self._entries else None
+
+
+class LatestFrameBuffer():
+    '''
+    Hand-off of camera frames from a subscription callback to a worker thread, newest frame first.
+
+    The callback deposits frames without ever blocking, and the worker always
+    takes the newest one. The frames it never took are dropped and counted,
+    so however fast the camera publishes, the worker never falls more than
+    one frame behind.
+    '''
+
+    def __init__(self, capacity: int = 2):
+        '''
+        Args:
+            capacity (int): Maximum number of frames waiting for the worker
+        '''
+        self.capacity = capacity
+        self._entries = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # Counters reported by the stats property
+        self._deposited = 0
+        self._taken = 0
+        self._dropped = 0
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Frames deposited, taken by the worker and dropped, and frames waiting
+        '''
+        with self._condition:
+            return {
+                "size": len(self._entries),
+                "deposited": self._deposited,
+                "taken": self._taken,
+                "dropped": self._dropped,
+            }
+
+    def put(self, stamp: int, item):
+        '''
+        Deposit a frame, dropping the oldest one if the buffer is full.
+
+        Args:
+            stamp (int): Stamp of the frame in nanoseconds
+            item: The frame
+        '''
+        with self._condition:
+            if len(self._entries) == self.capacity:
+                self._entries.popleft()
+                self._dropped += 1
+            self._entries.append((stamp, item))
+            self._deposited += 1
+            self._condition.notify()
+
+    def take(self, timeout: float = None):
+        '''
+        Wait for a frame and return the newest one, dropping the older ones.
+
+        Args:
+            timeout (float): Maximum wait (s), None to wait until a frame comes or the buffer is closed
+
+        Returns:
+            Tuple[int, item]: (stamp, item), None on timeout or once the buffer is closed
+        '''
+        with self._condition:
+            self._condition.wait_for(lambda: self._entries or self._closed, timeout)
+            if self._closed or not self._entries:
+                return None
+            entry = self._entries.pop()
+            self._dropped += len(self._entries)
+            self._entries.clear()
+            self._taken += 1
+            return entry
+
+    def close(self):
+        '''
+        Wake up the worker, take returns None from now on.
+        '''
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class ApproximateTimeSync():
+    '''
+    Pairs every logical camera frame with the detection set whose stamp is the closest.
+
+    Both sides are kept in DetectionBuffers, bounded in size and in age. A
+    frame is paired as soon as a detection set at least as recent as the
+    frame is available, as no later detection set can then be closer. Pairs
+    further apart than max_skew are dropped, and so are the detection sets
+    older than a paired frame.
+    '''
+
+    def __init__(self, max_skew: float = 0.2, queue_size: int = 5, max_age: float = 2.0):
+        '''
+        Args:
+            max_skew (float): Maximum difference (s) between the stamps of a frame and of its detection set
+            queue_size (int): Capacity of the frame and detection buffers
+            max_age (float): Age (s) after which unpaired frames and detection sets are evicted
+        '''
+        self._max_skew = int(max_skew * 1e9)
+        # (stamp, frame) and (stamp, detections), oldest first
+        self.frames = DetectionBuffer(queue_size, max_age)
+        self.detections = DetectionBuffer(queue_size, max_age)
+
+        # Counters reported by the stats property
+        self._paired = 0
+        self._skewed = 0
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Frames paired, frames dropped and the stats of the two buffers
+        '''
+        frames, detections = self.frames.stats, self.detections.stats
+        return {
+            "paired": self._paired,
+            "dropped_frames": self._skewed + frames["evicted_capacity"] + frames["evicted_age"],
+            "frames": frames,
+            "detections": detections,
+        }
+
+    def add_frame(self, stamp: int, frame) -> list:
+        '''
+        Add a logical camera frame.
+
+        Args:
+            stamp (int): Stamp of the frame in nanoseconds
+            frame: The frame
+
+        Returns:
+            List[Tuple[frame, detections]]: Pairs completed by this frame
+        '''
+        self.frames.append(stamp, frame)
+        self.detections.expire(stamp)
+        return self._match()
+
+    def add_detections(self, stamp: int, detections) -> list:
+        '''
+        Add the detection set of an RGB frame.
+
+        Args:
+            stamp (int): Stamp of the RGB frame in nanoseconds
+            detections: The detections
+
+        Returns:
+            List[Tuple[frame, detections]]: Pairs completed by this detection set
+        '''
+        self.detections.append(stamp, detections)
+        self.frames.expire(stamp)
+        return self._match()
+
+    def _match(self) -> list:
+        pairs = []
+        while len(self.frames) and len(self.detections):
+            frame_stamp, frame = self.frames[0]
+            if self.detections[-1][0] < frame_stamp:
+                # A detection set closer to this frame may still come
+                break
+            self.frames.popleft()
+
+            best_stamp, best = min(self.detections, key=lambda entry: abs(entry[0] - frame_stamp))
+            # Older detection sets can not be closer to the next frames
+            while self.detections[0][0] < best_stamp:
+                self.detections.popleft()
+
+            if abs(best_stamp - frame_stamp) > self._max_skew:
+                self._skewed += 1
+                continue
+            self._paired += 1
+            pairs.append((frame, best))
+        return pairs
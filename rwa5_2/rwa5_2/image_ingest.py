@@ -0,0 +1,147 @@
+'''
+Conversion of the sensor_msgs/Image frames of the cameras to BGR arrays without per-frame allocation.
+
+CvBridge.imgmsg_to_cv2 copies every frame into a new array. A bgr8 frame is
+already what the perception code uses, so it is wrapped as a read-only
+NumPy view of msg.data instead. Other 8-bit encodings are converted by
+OpenCV into a buffer allocated once per image size and reused for every
+frame.
+'''
+import cv2
+import numpy as np
+from cv_bridge import CvBridge
+
+# OpenCV conversion to BGR of the encodings converted into the reusable buffer, and their channel count
+CONVERSIONS = {
+    "rgb8": (cv2.COLOR_RGB2BGR, 3),
+    "bgra8": (cv2.COLOR_BGRA2BGR, 4),
+    "rgba8": (cv2.COLOR_RGBA2BGR, 4),
+    "mono8": (cv2.COLOR_GRAY2BGR, 1),
+}
+
+
+def image_view(msg, channels: int) -> np.ndarray:
+    '''
+    Read-only view of the pixels of an 8-bit image message, rows padded to msg.step included.
+
+    Args:
+        msg (Image): The image message
+        channels (int): Channels of the encoding
+
+    Returns:
+        np.ndarray: (height, width, channels) view of msg.data, (height, width) for one channel
+    '''
+    data = np.frombuffer(msg.data, dtype=np.uint8)
+    view = data[:msg.height * msg.step].reshape(msg.height, msg.step)[:, :msg.width * channels]
+    view = view.reshape(msg.height, msg.width, channels) if channels > 1 else view
+    view.flags.writeable = False
+    return view
+
+
+class ImageReader():
+    '''
+    BGR frames of one camera stream.
+
+    The array returned for a bgr8 frame is a view of the message and stays
+    valid as long as the message. The array returned for a converted frame
+    is the reusable buffer of the reader, overwritten by the next frame, so
+    a frame kept beyond that must be copied or its message kept instead.
+    '''
+
+    def __init__(self):
+        self._buffer = None
+        # Buffers of the crops converted by crops_bgr, by box index
+        self._crop_buffers = []
+        self._bridge = CvBridge()
+
+        # Counters reported by the stats property
+        self._views = 0
+        self._conversions = 0
+        self._fallbacks = 0
+        self._allocations = 0
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Frames wrapped without copy, converted into the buffer and copied by CvBridge, and buffer allocations
+        '''
+        return {
+            "views": self._views,
+            "conversions": self._conversions,
+            "fallbacks": self._fallbacks,
+            "allocations": self._allocations,
+        }
+
+    def to_bgr(self, msg) -> np.ndarray:
+        '''
+        BGR frame of an image message.
+
+        Args:
+            msg (Image): The image message
+
+        Returns:
+            np.ndarray: (height, width, 3) read-only BGR frame
+        '''
+        if msg.encoding == "bgr8":
+            self._views += 1
+            return image_view(msg, 3)
+
+        conversion = CONVERSIONS.get(msg.encoding)
+        if conversion is None:
+            # 16-bit and Bayer encodings, not produced by the ARIAC cameras
+            self._fallbacks += 1
+            return self._bridge.imgmsg_to_cv2(msg, "bgr8")
+
+        code, channels = conversion
+        shape = (msg.height, msg.width, 3)
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.empty(shape, dtype=np.uint8)
+            self._allocations += 1
+        self._buffer.flags.writeable = True
+        cv2.cvtColor(image_view(msg, channels), code, dst=self._buffer)
+        self._buffer.flags.writeable = False
+        self._conversions += 1
+        return self._buffer
+
+    def crops_bgr(self, msg, rois, start: int = 0) -> list:
+        '''
+        BGR pixels of boxes of an image message, only the boxes being converted.
+
+        The crops of a converted frame are views of reusable buffers, one per
+        box index, only reallocated when a box is larger than its buffer and
+        overwritten by the next call that uses the same indices.
+
+        Args:
+            msg (Image): The image message
+            rois (Sequence[Tuple[int, int, int, int]]): x1, y1, x2, y2 of the boxes
+            start (int): Buffer index of the first box, to keep the crops of the previous calls
+
+        Returns:
+            List[np.ndarray]: (y2 - y1, x2 - x1, 3) BGR crops, read-only views of the message for bgr8
+        '''
+        if msg.encoding == "bgr8":
+            self._views += len(rois)
+            image = image_view(msg, 3)
+            return [image[y1:y2, x1:x2] for x1, y1, x2, y2 in rois]
+
+        conversion = CONVERSIONS.get(msg.encoding)
+        if conversion is None:
+            self._fallbacks += 1
+            image = self._bridge.imgmsg_to_cv2(msg, "bgr8")
+            return [image[y1:y2, x1:x2] for x1, y1, x2, y2 in rois]
+
+        code, channels = conversion
+        image = image_view(msg, channels)
+        crops = []
+        for index, (x1, y1, x2, y2) in enumerate(rois, start):
+            while index >= len(self._crop_buffers):
+                self._crop_buffers.append(np.empty((0, 0, 3), dtype=np.uint8))
+            buffer = self._crop_buffers[index]
+            if buffer.shape[0] < y2 - y1 or buffer.shape[1] < x2 - x1:
+                buffer = np.empty((max(buffer.shape[0], y2 - y1), max(buffer.shape[1], x2 - x1), 3), dtype=np.uint8)
+                self._crop_buffers[index] = buffer
+                self._allocations += 1
+            crops.append(cv2.cvtColor(image[y1:y2, x1:x2], code, dst=buffer[:y2 - y1, :x2 - x1]))
+        self._conversions += len(rois)
+        return crops
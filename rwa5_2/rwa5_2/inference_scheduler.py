@@ -0,0 +1,90 @@
+'''
+Change gate deciding which RGB frames go through the model.
+'''
+import cv2
+import numpy as np
+
+
+class InferenceScheduler():
+    '''
+    Runs the detector only when the image changed or a refresh is due.
+
+    Every frame is reduced to a small grayscale thumbnail (area averaged, so
+    rendering noise mostly cancels out) and compared with the thumbnail of
+    the last frame that went through the model. The change score is the
+    largest difference of a thumbnail cell, so a single part picked from a
+    bin is enough to trigger inference while an unchanged scene is not.
+    '''
+
+    def __init__(self, threshold: float = 10.0, refresh_period: float = 5.0, thumbnail_size=(64, 48)):
+        '''
+        Args:
+            threshold (float): Change score (gray levels) from which the model runs, 0 to run on every frame
+            refresh_period (float): Maximum time (s) between two runs of the model
+            thumbnail_size (Tuple[int, int]): Width and height of the thumbnails
+        '''
+        self._threshold = threshold
+        self._refresh_period = int(refresh_period * 1e9)
+        self._thumbnail_size = tuple(thumbnail_size)
+
+        # Thumbnail and stamp of the last frame run through the model
+        self._reference = None
+        self._last_run = None
+
+        # Counters reported by the stats property
+        self._frames = 0
+        self._runs = 0
+        self.last_score = 0.0
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Frames seen, frames run through the model, frames skipped and the last change score
+        '''
+        return {
+            "frames": self._frames,
+            "runs": self._runs,
+            "skipped": self._frames - self._runs,
+            "last_score": self.last_score,
+        }
+
+    def thumbnail(self, image) -> np.ndarray:
+        '''
+        Args:
+            image (np.ndarray): BGR image
+
+        Returns:
+            np.ndarray: Grayscale thumbnail as int16
+        '''
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self._thumbnail_size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def should_run(self, stamp: int, image) -> bool:
+        '''
+        Decide if a frame goes through the model, and if so take it as the new reference.
+
+        Args:
+            stamp (int): Stamp of the frame in nanoseconds
+            image (np.ndarray): BGR frame
+
+        Returns:
+            bool: True if the model must run on this frame
+        '''
+        self._frames += 1
+        if self._threshold <= 0:
+            self._runs += 1
+            return True
+
+        thumbnail = self.thumbnail(image)
+        if self._reference is None:
+            run = True
+            self.last_score = float("inf")
+        else:
+            self.last_score = float(np.abs(thumbnail - self._reference).max())
+            run = self.last_score >= self._threshold or stamp - self._last_run >= self._refresh_period
+        if run:
+            self._reference = thumbnail
+            self._last_run = stamp
+            self._runs += 1
+        return run
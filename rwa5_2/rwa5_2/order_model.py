@@ -0,0 +1,233 @@
+'''
+Compact order model independent of the ROS messages.
+
+The records mirror the attributes of utils.Order (order_id, order_type,
+order_priority, order_task.agv_number, ...) so they can be used wherever an
+Order is read, but they are frozen, hashable, picklable and hold plain
+Python values only. encode()/decode() give a small binary form that needs
+nothing but the standard library: 10 bytes plus the UTF-8 order id and 3
+bytes per part for a kitting order, so 24 bytes for a two-part order with
+an 8-character id such as "MMB30H56".
+
+Only kitting tasks are modeled. Assembly and combined orders raise a
+ValueError on conversion instead of silently losing their task.
+'''
+import struct
+from dataclasses import dataclass, fields
+from typing import Optional, Tuple
+
+# Same values as the constants of ariac_msgs/msg/Order
+ORDER_KITTING = 0
+ORDER_ASSEMBLY = 1
+ORDER_COMBINED = 2
+
+# Version byte written at the start of every encoded order
+_ENCODING_VERSION = 1
+
+# version, order type, priority, has kitting task, length of the order id
+_ORDER_HEADER = struct.Struct("<BBBBH")
+# agv number, tray id, destination, number of parts
+_TASK_HEADER = struct.Struct("<BBBB")
+# quadrant, color, type
+_PART = struct.Struct("<BBB")
+
+
+def _check_order_type(order_type: int) -> None:
+    '''
+    Reject the order types whose task is not modeled.
+
+    Args:
+        order_type (int): Type of the order
+
+    Raises:
+        ValueError: The order is not a kitting order
+    '''
+    if order_type != ORDER_KITTING:
+        raise ValueError(f"Only kitting orders are supported, got order type {order_type}")
+
+
+class _Record():
+    '''
+    Base class of the frozen records, pickled from their field values.
+    '''
+    __slots__ = ()
+
+    def __reduce__(self):
+        return (self.__class__, tuple(getattr(self, f.name) for f in fields(self)))
+
+
+@dataclass(frozen=True)
+class PartRecord(_Record):
+    '''
+    Color and type of a part.
+    '''
+    __slots__ = ("color", "type")
+    color: int
+    type: int
+
+
+@dataclass(frozen=True)
+class KittingPartRecord(_Record):
+    '''
+    Part of a kitting task and the quadrant of the tray it goes to.
+    '''
+    __slots__ = ("quadrant", "part")
+    quadrant: int
+    part: PartRecord
+
+
+@dataclass(frozen=True)
+class KittingTaskRecord(_Record):
+    '''
+    Kitting task of an order.
+    '''
+    __slots__ = ("agv_number", "tray_id", "destination", "parts")
+    agv_number: int
+    tray_id: int
+    destination: int
+    parts: Tuple[KittingPartRecord, ...]
+
+
+@dataclass(frozen=True)
+class OrderRecord(_Record):
+    '''
+    One order of the topic /ariac/orders.
+    '''
+    __slots__ = ("order_id", "order_type", "order_priority", "order_task")
+    order_id: str
+    order_type: int
+    order_priority: bool
+    order_task: Optional[KittingTaskRecord]
+
+    @classmethod
+    def from_msg(cls, msg) -> "OrderRecord":
+        '''
+        Build a record from an ariac_msgs Order message.
+
+        Args:
+            msg (OrderMsg): The order message
+
+        Returns:
+            OrderRecord: The record
+
+        Raises:
+            ValueError: The order is not a kitting order
+        '''
+        _check_order_type(msg.type)
+        kitting_task = msg.kitting_task
+        task = KittingTaskRecord(
+            int(kitting_task.agv_number),
+            int(kitting_task.tray_id),
+            int(kitting_task.destination),
+            tuple(KittingPartRecord(int(p.quadrant), PartRecord(int(p.part.color), int(p.part.type)))
+                  for p in kitting_task.parts))
+        return cls(str(msg.id), int(msg.type), bool(msg.priority), task)
+
+    @classmethod
+    def from_order(cls, order) -> "OrderRecord":
+        '''
+        Build a record from a utils.Order.
+
+        Args:
+            order (Order): The order
+
+        Returns:
+            OrderRecord: The record
+
+        Raises:
+            ValueError: The order is not a kitting order
+        '''
+        _check_order_type(order.order_type)
+        task = None
+        if order.order_task is not None:
+            kitting_task = order.order_task
+            task = KittingTaskRecord(
+                int(kitting_task.agv_number),
+                int(kitting_task.tray_id),
+                int(kitting_task.destination),
+                tuple(KittingPartRecord(int(p.quadrant), PartRecord(int(p.part.color), int(p.part.type)))
+                      for p in kitting_task.parts))
+        return cls(str(order.order_id), int(order.order_type), bool(order.order_priority), task)
+
+    def to_msg(self):
+        '''
+        Build an ariac_msgs Order message from the record.
+
+        Returns:
+            OrderMsg: The order message
+
+        Raises:
+            ValueError: The order is not a kitting order
+        '''
+        _check_order_type(self.order_type)
+
+        # Imported here so that the module stays usable without ROS
+        from ariac_msgs.msg import (
+            Order as OrderMsg,
+            KittingPart as KittingPartMsg,
+        )
+
+        msg = OrderMsg()
+        msg.id = self.order_id
+        msg.type = self.order_type
+        msg.priority = self.order_priority
+        if self.order_task is not None:
+            msg.kitting_task.agv_number = self.order_task.agv_number
+            msg.kitting_task.tray_id = self.order_task.tray_id
+            msg.kitting_task.destination = self.order_task.destination
+            for part in self.order_task.parts:
+                part_msg = KittingPartMsg()
+                part_msg.quadrant = part.quadrant
+                part_msg.part.color = part.part.color
+                part_msg.part.type = part.part.type
+                msg.kitting_task.parts.append(part_msg)
+        return msg
+
+    def encode(self) -> bytes:
+        '''
+        Encode the record to bytes.
+
+        Returns:
+            bytes: The binary form of the order
+        '''
+        order_id = self.order_id.encode("utf-8")
+        chunks = [
+            _ORDER_HEADER.pack(_ENCODING_VERSION, self.order_type, self.order_priority,
+                               self.order_task is not None, len(order_id)),
+            order_id,
+        ]
+        if self.order_task is not None:
+            task = self.order_task
+            chunks.append(_TASK_HEADER.pack(task.agv_number, task.tray_id, task.destination, len(task.parts)))
+            chunks.extend(_PART.pack(p.quadrant, p.part.color, p.part.type) for p in task.parts)
+        return b"".join(chunks)
+
+    @classmethod
+    def decode(cls, data: bytes) -> "OrderRecord":
+        '''
+        Decode a record from the bytes produced by encode().
+
+        Args:
+            data (bytes): The binary form of the order
+
+        Returns:
+            OrderRecord: The record
+        '''
+        version, order_type, priority, has_task, id_length = _ORDER_HEADER.unpack_from(data, 0)
+        if version != _ENCODING_VERSION:
+            raise ValueError(f"Unsupported order encoding version {version}")
+        offset = _ORDER_HEADER.size
+        order_id = bytes(data[offset:offset + id_length]).decode("utf-8")
+        offset += id_length
+
+        task = None
+        if has_task:
+            agv_number, tray_id, destination, n_parts = _TASK_HEADER.unpack_from(data, offset)
+            offset += _TASK_HEADER.size
+            parts = []
+            for _ in range(n_parts):
+                quadrant, color, part_type = _PART.unpack_from(data, offset)
+                offset += _PART.size
+                parts.append(KittingPartRecord(quadrant, PartRecord(color, part_type)))
+            task = KittingTaskRecord(agv_number, tray_id, destination, tuple(parts))
+        return cls(order_id, order_type, bool(priority), task)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+'''
+The perception nodes and the ARIAC interface in one process.
+
+rclpy has no intra-process communication: a message published to a
+subscription of the same process still goes through the middleware and is
+serialized. The labels of the logical camera frames are therefore handed
+directly to the SensorRead of the interface (see SensorRead.local_input).
+They are still published on their latched topic for other processes, which
+costs one serialization per change of the labels. Both bin cameras share
+the model of the batch server, and Python, rclpy, OpenCV and the inference
+runtime are loaded once instead of once per node.
+'''
+import rclpy
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.parameter import Parameter
+
+from ariac_interface_util import AriacInterface
+from tray_detection import ArucoTrayNode
+from yolo_batch_server import YoloBatchServer
+
+# kts cameras and the names of their tray nodes, as in ariac_yolo.launch.py
+TRAY_NODES = (("image_subscriber_3", "kts1_camera"), ("image_subscriber_4", "kts2_camera"))
+
+
+class LocalOutput():
+    '''
+    Output of the labels of one camera, used in place of its publisher.
+    '''
+
+    def __init__(self, publisher, deliver):
+        '''
+        Args:
+            publisher (Publisher): Latched publisher of the labels, for the other processes
+            deliver (Callable): Consumer of the labels in this process, from SensorRead.local_input
+        '''
+        self._publisher = publisher
+        self._deliver = deliver
+
+    def publish(self, msg):
+        '''
+        Hand labels to the consumer of this process, and publish them for the other processes.
+
+        They are published even without subscribers, so that a subscriber
+        joining later receives the current labels from the latched topic.
+
+        Args:
+            msg (LogicalCameraLabels): The labels, not modified afterwards
+        '''
+        self._deliver(msg)
+        self._publisher.publish(msg)
+
+
+def main(args=None):
+    '''
+    Create the interface and the perception nodes and spin them in one executor.
+    '''
+    rclpy.init(args=args)
+    # Same node name as in ariac_interface.launch.py, for the parameters, remappings and logs addressed to it
+    interface = AriacInterface("rwa5_interface")
+    server = YoloBatchServer()
+    tray_nodes = [ArucoTrayNode(node_name, camera_name) for node_name, camera_name in TRAY_NODES]
+
+    # The RGB header stamps are simulation time, the logical camera frames are stamped on reception.
+    # Only the perception nodes use it, the interface keeps the clock it has in its own process.
+    for node in [server] + tray_nodes:
+        node.set_parameters([Parameter("use_sim_time", Parameter.Type.BOOL, True)])
+
+    # The labels are the part types and tray IDs of the frames of the logical cameras
+    sensor_read = interface.sensor_read
+    for camera_name, publisher in list(server.outputs.items()):
+        server.outputs[camera_name] = LocalOutput(publisher, sensor_read.local_input(camera_name + "_logical"))
+    for node in tray_nodes:
+        node.publisher_ = LocalOutput(node.publisher_, sensor_read.local_input(node.camera_name + "_logical"))
+
+    executor = MultiThreadedExecutor()
+    for node in [interface, server] + tray_nodes:
+        executor.add_node(node)
+    executor.spin()
+
+    for node in [interface, server] + tray_nodes:
+        node.destroy_node()
+    rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
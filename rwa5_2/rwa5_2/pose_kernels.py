@@ -0,0 +1,328 @@
+'''
+Pure NumPy pose kernels following the PyKDL conventions used in utils.py.
+
+A pose is stored as a 7-vector [x, y, z, qx, qy, qz, qw] and a batch of poses
+as an (N, 7) array. Every kernel accepts either a single pose or a batch and
+returns the same leading shape, so the same code serves one part or a whole
+camera frame. Quaternions are expected to be unit length, as they are in every
+ROS pose message.
+'''
+import math
+
+import numpy as np
+
+
+# KDL treats a rotation matrix trace above this value as the "easy" branch
+_TRACE_EPSILON = 1e-12
+
+# KDL switches to the gimbal-lock branch of GetRPY within this margin of +/- pi/2
+_GIMBAL_EPSILON = 1e-12
+
+
+def quat_to_matrix(quat) -> np.ndarray:
+    '''
+    Convert quaternions to rotation matrices, same as PyKDL.Rotation.Quaternion.
+
+    Args:
+        quat (array_like): (..., 4) quaternions in [x, y, z, w] order
+
+    Returns:
+        np.ndarray: (..., 3, 3) rotation matrices
+    '''
+    q = np.asarray(quat, dtype=np.float64)
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    x2, y2, z2, w2 = x * x, y * y, z * z, w * w
+
+    R = np.empty(q.shape[:-1] + (3, 3))
+    R[..., 0, 0] = w2 + x2 - y2 - z2
+    R[..., 0, 1] = 2 * x * y - 2 * w * z
+    R[..., 0, 2] = 2 * x * z + 2 * w * y
+    R[..., 1, 0] = 2 * w * z + 2 * x * y
+    R[..., 1, 1] = w2 - x2 + y2 - z2
+    R[..., 1, 2] = 2 * y * z - 2 * w * x
+    R[..., 2, 0] = 2 * x * z - 2 * w * y
+    R[..., 2, 1] = 2 * y * z + 2 * w * x
+    R[..., 2, 2] = w2 - x2 - y2 + z2
+    return R
+
+
+def matrix_to_quat(matrix) -> np.ndarray:
+    '''
+    Convert rotation matrices to quaternions, same as PyKDL Rotation.GetQuaternion.
+
+    The branch selection mirrors KDL so that the sign of the returned
+    quaternion matches what Mult_pose used to return.
+
+    Args:
+        matrix (array_like): (..., 3, 3) rotation matrices
+
+    Returns:
+        np.ndarray: (..., 4) quaternions in [x, y, z, w] order
+    '''
+    R = np.asarray(matrix, dtype=np.float64)
+    if R.ndim == 2:
+        # A single matrix is faster with plain floats than with the batched branches
+        return np.array(_matrix_to_quat_single(R.tolist()))
+
+    r00, r01, r02 = R[..., 0, 0], R[..., 0, 1], R[..., 0, 2]
+    r10, r11, r12 = R[..., 1, 0], R[..., 1, 1], R[..., 1, 2]
+    r20, r21, r22 = R[..., 2, 0], R[..., 2, 1], R[..., 2, 2]
+    trace = r00 + r11 + r22
+
+    # Select the KDL branch for every matrix of the batch
+    use_trace = trace > _TRACE_EPSILON
+    use_x = ~use_trace & (r00 > r11) & (r00 > r22)
+    use_y = ~use_trace & ~use_x & (r11 > r22)
+    use_z = ~use_trace & ~use_x & ~use_y
+
+    # Clamp the square root arguments, the unused branches may be negative
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s_w = 2.0 * np.sqrt(np.maximum(trace + 1.0, 0.0))
+        s_x = 2.0 * np.sqrt(np.maximum(1.0 + r00 - r11 - r22, 0.0))
+        s_y = 2.0 * np.sqrt(np.maximum(1.0 + r11 - r00 - r22, 0.0))
+        s_z = 2.0 * np.sqrt(np.maximum(1.0 + r22 - r00 - r11, 0.0))
+
+        q = np.empty(R.shape[:-2] + (4,))
+        q[..., 0] = np.select(
+            [use_trace, use_x, use_y, use_z],
+            [(r21 - r12) / s_w, 0.25 * s_x, (r01 + r10) / s_y, (r02 + r20) / s_z])
+        q[..., 1] = np.select(
+            [use_trace, use_x, use_y, use_z],
+            [(r02 - r20) / s_w, (r01 + r10) / s_x, 0.25 * s_y, (r12 + r21) / s_z])
+        q[..., 2] = np.select(
+            [use_trace, use_x, use_y, use_z],
+            [(r10 - r01) / s_w, (r02 + r20) / s_x, (r12 + r21) / s_y, 0.25 * s_z])
+        q[..., 3] = np.select(
+            [use_trace, use_x, use_y, use_z],
+            [0.25 * s_w, (r21 - r12) / s_x, (r02 - r20) / s_y, (r10 - r01) / s_z])
+    return q
+
+
+def _matrix_to_quat_single(R) -> tuple:
+    '''
+    Scalar version of matrix_to_quat for one matrix given as nested lists.
+    '''
+    (r00, r01, r02), (r10, r11, r12), (r20, r21, r22) = R
+    trace = r00 + r11 + r22
+    if trace > _TRACE_EPSILON:
+        s = 0.5 / math.sqrt(trace + 1.0)
+        return ((r21 - r12) * s, (r02 - r20) * s, (r10 - r01) * s, 0.25 / s)
+    if r00 > r11 and r00 > r22:
+        s = 2.0 * math.sqrt(1.0 + r00 - r11 - r22)
+        return (0.25 * s, (r01 + r10) / s, (r02 + r20) / s, (r21 - r12) / s)
+    if r11 > r22:
+        s = 2.0 * math.sqrt(1.0 + r11 - r00 - r22)
+        return ((r01 + r10) / s, 0.25 * s, (r12 + r21) / s, (r02 - r20) / s)
+    s = 2.0 * math.sqrt(1.0 + r22 - r00 - r11)
+    return ((r02 + r20) / s, (r12 + r21) / s, 0.25 * s, (r10 - r01) / s)
+
+
+def rpy_to_matrix(rpy) -> np.ndarray:
+    '''
+    Convert roll, pitch, yaw angles to rotation matrices, same as PyKDL.Rotation.RPY.
+
+    Args:
+        rpy (array_like): (..., 3) angles [roll, pitch, yaw] in radians
+
+    Returns:
+        np.ndarray: (..., 3, 3) rotation matrices
+    '''
+    a = np.asarray(rpy, dtype=np.float64)
+    cr, sr = np.cos(a[..., 0]), np.sin(a[..., 0])
+    cp, sp = np.cos(a[..., 1]), np.sin(a[..., 1])
+    cy, sy = np.cos(a[..., 2]), np.sin(a[..., 2])
+
+    R = np.empty(a.shape[:-1] + (3, 3))
+    R[..., 0, 0] = cy * cp
+    R[..., 0, 1] = cy * sp * sr - sy * cr
+    R[..., 0, 2] = cy * sp * cr + sy * sr
+    R[..., 1, 0] = sy * cp
+    R[..., 1, 1] = sy * sp * sr + cy * cr
+    R[..., 1, 2] = sy * sp * cr - cy * sr
+    R[..., 2, 0] = -sp
+    R[..., 2, 1] = cp * sr
+    R[..., 2, 2] = cp * cr
+    return R
+
+
+def matrix_to_rpy(matrix) -> np.ndarray:
+    '''
+    Convert rotation matrices to roll, pitch, yaw angles, same as PyKDL Rotation.GetRPY.
+
+    Args:
+        matrix (array_like): (..., 3, 3) rotation matrices
+
+    Returns:
+        np.ndarray: (..., 3) angles [roll, pitch, yaw] in radians
+    '''
+    R = np.asarray(matrix, dtype=np.float64)
+    pitch = np.arctan2(-R[..., 2, 0], np.sqrt(R[..., 0, 0] ** 2 + R[..., 1, 0] ** 2))
+    gimbal_lock = np.abs(pitch) > (np.pi / 2.0 - _GIMBAL_EPSILON)
+
+    rpy = np.empty(R.shape[:-2] + (3,))
+    rpy[..., 0] = np.where(gimbal_lock, 0.0, np.arctan2(R[..., 2, 1], R[..., 2, 2]))
+    rpy[..., 1] = pitch
+    rpy[..., 2] = np.where(gimbal_lock,
+                           np.arctan2(-R[..., 0, 1], R[..., 1, 1]),
+                           np.arctan2(R[..., 1, 0], R[..., 0, 0]))
+    return rpy
+
+
+def quat_to_rpy(quat) -> np.ndarray:
+    '''
+    Convert quaternions to roll, pitch, yaw angles.
+
+    Args:
+        quat (array_like): (..., 4) quaternions in [x, y, z, w] order
+
+    Returns:
+        np.ndarray: (..., 3) angles [roll, pitch, yaw] in radians
+    '''
+    return matrix_to_rpy(quat_to_matrix(quat))
+
+
+def rpy_to_quat(rpy) -> np.ndarray:
+    '''
+    Convert roll, pitch, yaw angles to quaternions.
+
+    Args:
+        rpy (array_like): (..., 3) angles [roll, pitch, yaw] in radians
+
+    Returns:
+        np.ndarray: (..., 4) quaternions in [x, y, z, w] order
+    '''
+    return matrix_to_quat(rpy_to_matrix(rpy))
+
+
+def pose_to_matrix(pose) -> np.ndarray:
+    '''
+    Convert poses to homogeneous transformation matrices.
+
+    Args:
+        pose (array_like): (..., 7) poses [x, y, z, qx, qy, qz, qw]
+
+    Returns:
+        np.ndarray: (..., 4, 4) homogeneous matrices
+    '''
+    p = np.asarray(pose, dtype=np.float64)
+    T = np.zeros(p.shape[:-1] + (4, 4))
+    T[..., :3, :3] = quat_to_matrix(p[..., 3:7])
+    T[..., :3, 3] = p[..., 0:3]
+    T[..., 3, 3] = 1.0
+    return T
+
+
+def matrix_to_pose(matrix) -> np.ndarray:
+    '''
+    Convert homogeneous transformation matrices to poses.
+
+    Args:
+        matrix (array_like): (..., 4, 4) homogeneous matrices
+
+    Returns:
+        np.ndarray: (..., 7) poses [x, y, z, qx, qy, qz, qw]
+    '''
+    T = np.asarray(matrix, dtype=np.float64)
+    pose = np.empty(T.shape[:-2] + (7,))
+    pose[..., 0:3] = T[..., :3, 3]
+    pose[..., 3:7] = matrix_to_quat(T[..., :3, :3])
+    return pose
+
+
+def transform_poses(matrix, poses, out=None) -> np.ndarray:
+    '''
+    Apply one homogeneous transform to a single pose or a batch of poses.
+
+    Args:
+        matrix (array_like): (4, 4) transform of the parent frame
+        poses (array_like): (7,) or (N, 7) poses expressed in the parent frame
+        out (np.ndarray, optional): Array of the same shape as poses to write the result to
+
+    Returns:
+        np.ndarray: (7,) or (N, 7) poses expressed in the frame of the transform
+    '''
+    T = np.asarray(matrix, dtype=np.float64)
+    p = np.asarray(poses, dtype=np.float64)
+    R, t = T[:3, :3], T[:3, 3]
+
+    if out is None:
+        out = np.empty(p.shape)
+    out[..., 0:3] = p[..., 0:3] @ R.T + t
+    out[..., 3:7] = matrix_to_quat(R @ quat_to_matrix(p[..., 3:7]))
+    return out
+
+
+def mult_pose(pose_1, pose_2) -> np.ndarray:
+    '''
+    Multiply two poses (or two broadcastable batches of poses) together,
+    same as PyKDL Frame1 * Frame2.
+
+    Args:
+        pose_1 (array_like): (7,) or (N, 7) poses of the first frame
+        pose_2 (array_like): (7,) or (N, 7) poses of the second frame
+
+    Returns:
+        np.ndarray: (7,) or (N, 7) poses of the resulting frame
+    '''
+    p1 = np.asarray(pose_1, dtype=np.float64)
+    p2 = np.asarray(pose_2, dtype=np.float64)
+    R1 = quat_to_matrix(p1[..., 3:7])
+    R2 = quat_to_matrix(p2[..., 3:7])
+
+    shape = np.broadcast_shapes(p1.shape, p2.shape)
+    out = np.empty(shape)
+    out[..., 0:3] = np.einsum('...ij,...j->...i', R1, p2[..., 0:3]) + p1[..., 0:3]
+    out[..., 3:7] = matrix_to_quat(R1 @ R2)
+    return out
+
+
+def pose_msg_to_array(pose) -> np.ndarray:
+    '''
+    Convert a geometry_msgs Pose to a pose array.
+
+    Args:
+        pose (Pose): Pose message
+
+    Returns:
+        np.ndarray: (7,) pose [x, y, z, qx, qy, qz, qw]
+    '''
+    p, q = pose.position, pose.orientation
+    return np.array([p.x, p.y, p.z, q.x, q.y, q.z, q.w])
+
+
+def pose_msgs_to_array(poses, out=None) -> np.ndarray:
+    '''
+    Convert a sequence of geometry_msgs Pose to a batch of poses.
+
+    Args:
+        poses (Iterable[Pose]): Pose messages
+        out (np.ndarray, optional): (N, 7) array to fill instead of allocating one
+
+    Returns:
+        np.ndarray: (N, 7) poses [x, y, z, qx, qy, qz, qw]
+    '''
+    poses = list(poses)
+    if out is None:
+        out = np.empty((len(poses), 7))
+    for i, pose in enumerate(poses):
+        p, q = pose.position, pose.orientation
+        out[i] = (p.x, p.y, p.z, q.x, q.y, q.z, q.w)
+    return out
+
+
+def array_to_pose_msg(array, pose):
+    '''
+    Fill a geometry_msgs Pose from a pose array.
+
+    Args:
+        array (array_like): (7,) pose [x, y, z, qx, qy, qz, qw]
+        pose (Pose): Pose message to fill
+
+    Returns:
+        Pose: The filled pose message
+    '''
+    x, y, z, qx, qy, qz, qw = (float(v) for v in array)
+    pose.position.x, pose.position.y, pose.position.z = x, y, z
+    pose.orientation.x, pose.orientation.y = qx, qy
+    pose.orientation.z, pose.orientation.w = qz, qw
+    return pose
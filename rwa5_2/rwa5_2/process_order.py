@@ -17,6 +17,7 @@ from ariac_msgs.srv import ChangeGripper
 
 import robot_move as RM
 from utils import COLOROFPARTS, TYPEOFPARTS, QuadrantsOffset
+from sensor_store import PlacedPartIndex
 
 FixQuadrantPositionsRelativeTray = {
     1 : np.array([-0.13, -0.08, 0]),
@@ -62,6 +63,8 @@ class ProcessOrder():
         self._tray_info = None # {} dictonary containing id, pose, agv_num, "pick" true or not details
         # Parts that are already processed
         self._parts_done = []
+        # Place positions of the processed parts, ignored when looking for dropped parts on the AGVs
+        self._placed_parts = PlacedPartIndex()
 
         self._recievedOrder = False
 
@@ -195,7 +198,7 @@ class ProcessOrder():
                 else:
                     self.node.get_logger().info("Picking Order") 
                     # part_info = self.node.sensor_read.get_part_pose_from_sensor(part_color=order["color"], part_type=order["type"])
-                    part_info = self.node.sensor_read.get_part_pose_from_agv(self._parts_done, part_color=order['color'], part_type=order['type'],verbose=True)
+                    part_info = self.node.sensor_read.get_part_pose_from_agv(self._placed_parts, part_color=order['color'], part_type=order['type'],verbose=True)
                     if part_info is None:
                         part_info = self.node.sensor_read.get_part_pose_from_sensor(part_color=order["color"], part_type=order["type"],verbose=True)
                     self.node.get_logger().info(str(part_info['agv_num']))
@@ -246,6 +249,7 @@ class ProcessOrder():
                             "part_place_pose" : self.get_agv_tray_pose(order["agv_num"],order["quadrant"])
                         })
                         self._parts_done.append(part_info)
+                        self._placed_parts.add(order["agv_num"], order["type"], order["color"], part_info["part_place_pose"])
                         self.node.get_logger().info(f"Parts done:,{self._parts_done}")
                     else:
                         if not self.node.vacuum_gripper_state.attached and not self.node.vacuum_gripper_state.enabled: 
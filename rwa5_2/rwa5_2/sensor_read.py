@@ -1,10 +1,13 @@
 import os
 import yaml
 from functools import partial
-import math 
+import threading
+
+import numpy as np
 
 import rclpy
 from rclpy.qos import qos_profile_sensor_data
+from rclpy.logging import LoggingSeverity
 
 from ariac_msgs.msg import (
     Order as OrderMsg,
@@ -15,20 +18,25 @@ from ariac_msgs.msg import (
     BasicLogicalCameraImage as BasicLogicalCameraImageMsg,
     PartPose as PartPoseMsg
 )
-from sensor_msgs.msg import (
-    Image as ImageMsg,
-    PointCloud as PointCloudMsg,
-    LaserScan as LaserScanMsg,
-)
 from geometry_msgs.msg import Pose
+from robot_commander_msgs.msg import LogicalCameraLabels as LogicalCameraLabelsMsg
 
+import pose_kernels as PK
+from frame_labels import LABELS_QOS, labels_topic
+from sensor_transforms import SensorTransformCache
+from sensor_store import (
+    SensorObservations,
+    DetectionIndex,
+    frame_fingerprint,
+    frame_key,
+    SOURCE_AGV,
+    SOURCE_BINS,
+    SOURCE_KTS
+)
 from utils import (  
-    Mult_pose,
-    Quart_to_RPY,
     AdvancedLogicalCameraImage,
     COLOROFPARTS,
-    TYPEOFPARTS,
-    RPY_to_Quart
+    TYPEOFPARTS
 )
 from launch_ros.substitutions import FindPackageShare
     
@@ -40,15 +48,42 @@ ARIAC_SENSORS_2_TYPE = {
     'advanced_logical_camera': "image",
 }
 
-# Constants mapping ARIAC sensor types to their ROS message classes
-ARIAC_SENSORS_2_Msg = {
-    'rgb_camera': ImageMsg,
-    'basic_logical_camera': BasicLogicalCameraImageMsg,
-    'advanced_logical_camera': AdvancedLogicalCameraImageMsg,
-}
+
+# Frames kept per basic logical camera while waiting for their labels
+FRAME_HISTORY = 4
+
+
+def is_labeled_camera(sensor_name: str, sensor_type: str) -> bool:
+    '''
+    Whether a sensor is a basic logical camera labeled by a perception node.
+
+    The basic logical cameras do not report part types and tray IDs, the
+    perception node of the RGB camera "<camera>" publishes them for the
+    frames of "<camera>_logical" (see frame_labels). The RGB cameras are
+    only read by the perception nodes.
+
+    Arguments:
+        sensor_name -- Name of the sensor in the configuration
+        sensor_type -- Type of the sensor in the configuration
+    '''
+    return sensor_type == 'basic_logical_camera' and sensor_name.endswith("_logical")
 
 class SensorRead():
-    def __init__(self, node, callback_group, sensor_config="new_sensors"):
+    def __init__(self, node, callback_group, sensor_config="new_sensors", lazy=False, dedup_tolerance=1e-4):
+        '''
+        Subscribe to the cameras of a sensor configuration.
+
+        Arguments:
+            node -- The ROS node
+            callback_group -- Callback group of the camera subscriptions
+            sensor_config -- Name of the sensor configuration in the config folder
+            lazy -- If True, callbacks only keep the latest raw message of each camera
+                    and parsing happens on the first query after a change
+            dedup_tolerance -- Quantization step (m, and quaternion units) of the frame fingerprint used to
+                               skip frames identical to the previous one of the same camera, None to disable.
+                               Not used in lazy mode, where a frame only replaces the pending one and the
+                               fingerprint would cost more than the callback it saves
+        '''
         # Finding the package share directory
         pkg_share = FindPackageShare(package='rwa5_2').find('rwa5_2')
         sensor_config_path = os.path.join(pkg_share, 'config', sensor_config + ".yaml")
@@ -61,20 +96,74 @@ class SensorRead():
         with open(sensor_config_path, "r") as file:
             self.yaml_data = yaml.safe_load(file)
         
-        # Initialize sensors_info dictionary
+        # Cached sensor-to-world transforms, seeded from the pose blocks of the configuration
+        self.transform_cache = SensorTransformCache(self.yaml_data["sensors"], logger=self.node.get_logger())
+
+        # Initialize sensor_data dictionary, one columnar store per sensor refreshed in place
+        self.sensor_data = {}
+        # Index of the stores by part (type, color) and tray id, split by source class
+        self.index = DetectionIndex()
+        # Lazy mode: latest unparsed message of every camera that changed since the last query
+        self.lazy = lazy
+        self._pending = {}
+        # Duplicate-frame suppression: fingerprint of the last accepted frame and counters of every camera
+        self.dedup_tolerance = None if lazy else dedup_tolerance
+        self._fingerprints = {}
+        # Labeled cameras: frame key -> latest frames, latest labels, and key of the last joined frame
+        self._frames = {}
+        self._labels = {}
+        self._joined = {}
+        self._frames_received = {}
+        self._frames_skipped = {}
+        # Guards the stores, callbacks and queries run in different executor threads
+        self._lock = threading.Lock()
+
+        # Initialize sensors_info dictionary, and the subscriptions to the labels of the labeled cameras
         self.sensors_info = {}
+        self.labels_info = {}
         
         # Create subscriptions for each sensor based on configuration
         for sensor_name, info in self.yaml_data["sensors"].items():
-            self.sensors_info[sensor_name] = self.node.create_subscription(
-                ARIAC_SENSORS_2_Msg[info["type"]],
-                f"/ariac/sensors/{sensor_name}/{ARIAC_SENSORS_2_TYPE[info['type']]}",
-                partial(self._advanced_camera_cb, name=sensor_name),
-                qos_profile_sensor_data, callback_group=callback_group   
-            )
-
-        # Initialize sensor_data dictionary
-        self.sensor_data = {}
+            topic = f"/ariac/sensors/{sensor_name}/{ARIAC_SENSORS_2_TYPE[info['type']]}"
+            if info["type"] == 'advanced_logical_camera':
+                self.sensors_info[sensor_name] = self.node.create_subscription(
+                    AdvancedLogicalCameraImageMsg,
+                    topic,
+                    partial(self._advanced_camera_cb, name=sensor_name),
+                    qos_profile_sensor_data, callback_group=callback_group   
+                )
+            elif is_labeled_camera(sensor_name, info["type"]):
+                self.sensors_info[sensor_name] = self.node.create_subscription(
+                    BasicLogicalCameraImageMsg,
+                    topic,
+                    partial(self._basic_camera_cb, name=sensor_name),
+                    qos_profile_sensor_data, callback_group=callback_group
+                )
+                self.labels_info[sensor_name] = self.node.create_subscription(
+                    LogicalCameraLabelsMsg,
+                    labels_topic(sensor_name),
+                    partial(self._labels_cb, name=sensor_name),
+                    LABELS_QOS, callback_group=callback_group
+                )
+
+    def local_input(self, sensor_name: str):
+        '''
+        Feed the labels of a labeled camera from the same process instead of their topic.
+
+        The labels subscription of the camera is destroyed and the returned
+        function takes its place, so the labels of a perception node running
+        in the same process are not serialized.
+
+        Arguments:
+            sensor_name -- Name of the logical camera in the configuration
+
+        Returns:
+            Function taking every new LogicalCameraLabels message of the camera
+        '''
+        subscription = self.labels_info.pop(sensor_name, None)
+        if subscription is not None:
+            self.node.destroy_subscription(subscription)
+        return partial(self._labels_cb, name=sensor_name)
 
     def _advanced_camera_cb(self, msg: AdvancedLogicalCameraImageMsg, name: str):
         '''
@@ -84,49 +173,177 @@ class SensorRead():
             msg -- AdvancedLogicalCameraImage message
             name -- Name of the sensor
         '''
+        fingerprint = None
+        if self.dedup_tolerance is not None:
+            fingerprint = frame_fingerprint(msg, self.dedup_tolerance)
+
+        with self._lock:
+            self._frames_received[name] = self._frames_received.get(name, 0) + 1
+            # Skip frames with the same content as the previous one of this camera
+            if fingerprint is not None:
+                if self._fingerprints.get(name) == fingerprint:
+                    self._frames_skipped[name] = self._frames_skipped.get(name, 0) + 1
+                    return
+                self._fingerprints[name] = fingerprint
+
+            if self.lazy:
+                # Only keep the message, it is parsed by the next query
+                self._pending[name] = (msg, None)
+            else:
+                self._ingest(msg, name)
+
+    def _basic_camera_cb(self, msg: BasicLogicalCameraImageMsg, name: str):
+        '''
+        Callback for the frames of a labeled camera, joined with the labels of the same frame key
+
+        Arguments:
+            msg -- BasicLogicalCameraImage message
+            name -- Name of the sensor
+        '''
+        key = frame_key(msg)
+        with self._lock:
+            self._frames_received[name] = self._frames_received.get(name, 0) + 1
+            frames = self._frames.setdefault(name, {})
+            frames.pop(key, None)
+            frames[key] = msg
+            if len(frames) > FRAME_HISTORY:
+                del frames[next(iter(frames))]
+            self._join(name)
+
+    def _labels_cb(self, msg: LogicalCameraLabelsMsg, name: str):
+        '''
+        Callback for the labels of a labeled camera, joined with the frame of the same key
+
+        Arguments:
+            msg -- LogicalCameraLabels message
+            name -- Name of the sensor
+        '''
+        with self._lock:
+            self._labels[name] = msg
+            self._joined.pop(name, None)
+            self._join(name)
+
+    def _join(self, name: str):
+        '''
+        Ingest the frame of a labeled camera with the key of its labels, if received. The caller holds the lock.
+
+        A frame with the same key as the last joined one has the same content
+        and is skipped as a duplicate.
+
+        Arguments:
+            name -- Name of the sensor
+        '''
+        labels = self._labels.get(name)
+        if labels is None:
+            return
+        frame = self._frames.get(name, {}).get(labels.frame_key)
+        if frame is None:
+            return
+        if self._joined.get(name) == labels.frame_key:
+            self._frames_skipped[name] = self._frames_skipped.get(name, 0) + 1
+            return
+        self._joined[name] = labels.frame_key
+
+        if self.lazy:
+            self._pending[name] = (frame, labels)
+        else:
+            self._ingest(frame, name, labels)
+
+    @property
+    def frame_stats(self) -> dict:
+        '''
+        Number of frames received and skipped as duplicates for every camera.
+
+        Returns:
+            dict: name -> {"received", "skipped"}
+        '''
+        with self._lock:
+            return {
+                name: {"received": received, "skipped": self._frames_skipped.get(name, 0)}
+                for name, received in self._frames_received.items()
+            }
+
+    def _ingest(self, msg, name: str, labels: LogicalCameraLabelsMsg = None):
+        '''
+        Parse a message into the store of its sensor and update the index. The caller holds the lock.
+
+        Arguments:
+            msg -- AdvancedLogicalCameraImage message, or BasicLogicalCameraImage message of a labeled camera
+            name -- Name of the sensor
+            labels -- Labels of the BasicLogicalCameraImage message
+        '''
+        if labels is not None:
+            # Only the labeled parts and trays of the frame are stored
+            observations = self.sensor_data.get(name)
+            if observations is None:
+                observations = SensorObservations()
+            observations.refresh_labeled(self.transform_cache.get(name, msg.sensor_pose), msg, labels)
+            self.sensor_data[name] = observations
+            self.index.update(name, observations)
+            return
+
         # Parse AdvancedLogicalCameraImage message
         _image = AdvancedLogicalCameraImage(msg.part_poses,
                                             msg.tray_poses,
                                             msg.sensor_pose)
         # Store parsed data in sensor_data dictionary
-        self.sensor_data[name] = self.parse_advanced_camera_image(_image)
+        self.sensor_data[name] = self.parse_advanced_camera_image(_image, name, self.sensor_data.get(name))
+        self.index.update(name, self.sensor_data[name])
+
+    def _refresh(self):
+        '''
+        Parse the messages received since the last query (lazy mode). The caller holds the lock.
+        '''
+        if not self._pending:
+            return
+        for name, (msg, labels) in self._pending.items():
+            self._ingest(msg, name, labels)
+        self._pending.clear()
      
-    def parse_advanced_camera_image(self, image: AdvancedLogicalCameraImage) -> str:
+    def parse_advanced_camera_image(self, image: AdvancedLogicalCameraImage, name=None, out=None) -> SensorObservations:
         '''
-        Parse an AdvancedLogicalCameraImage message and return a string representation.
+        Parse an AdvancedLogicalCameraImage message into a columnar store of world-frame detections.
+
+        Arguments:
+            image -- AdvancedLogicalCameraImage to parse
+            name -- Name of the sensor, used to look up its cached transform
+            out -- SensorObservations to refresh in place instead of creating a new one
         '''
+        if name is None:
+            sensor_transform = PK.pose_to_matrix(PK.pose_msg_to_array(image._sensor_pose))
+        else:
+            sensor_transform = self.transform_cache.get(name, image._sensor_pose)
 
-        # Initialize output list
-        output = []
-        
-        # Process part poses
-        for i, part_pose in enumerate(image._part_poses):
-            part_world_pose = Mult_pose(image._sensor_pose, part_pose.pose)
-            roll, pitch, yaw = Quart_to_RPY(part_world_pose.orientation)
-            output.append({
-                "is_part": True,
-                "pose": [part_world_pose.position.x, part_world_pose.position.y, part_world_pose.position.z],
-                "orientation": [roll, pitch, yaw],
-                "color": part_pose.part.color,
-                "type": part_pose.part.type,
-                "tray_id": None
-            })
-        
-        # Process tray poses
-        for i, tray in enumerate(image._tray_poses):
-            tray_world_pose = Mult_pose(image._sensor_pose, tray.pose)
-            roll, pitch, yaw = Quart_to_RPY(tray_world_pose.orientation)
-            output.append({
-                "is_part": False,
-                "pose": [tray_world_pose.position.x, tray_world_pose.position.y, tray_world_pose.position.z],
-                "orientation": [roll, pitch, yaw],
-                "color": None,
-                "type": None,
-                "tray_id": tray.id
-            })
+        # Parts and trays are transformed with the same sensor transform and written in place
+        if out is None:
+            out = SensorObservations()
+        out.refresh(sensor_transform, image._part_poses, image._tray_poses)
 
         # Return parsed output
-        return output
+        return out
+
+    def _pose_of(self, observations: SensorObservations, row: int) -> Pose:
+        '''
+        Build a Pose message from one row of a store.
+        '''
+        return PK.array_to_pose_msg(observations.pose[row], Pose())
+
+    def _log_detection(self, title, observations: SensorObservations, row: int):
+        '''
+        Log the position and orientation (rpy) of one row of a store.
+
+        The store only holds quaternions, roll, pitch and yaw are computed here
+        and only when the logger actually emits info messages.
+        '''
+        logger = self.node.get_logger()
+        if not logger.is_enabled_for(LoggingSeverity.INFO):
+            return
+        position = observations.pose[row, 0:3]
+        rpy = observations.rpy(row)
+        logger.info(f"""\n==========================
+                - {title}
+                    - Position (xyz): [{position[0]:.3f}, {position[1]:.3f}, {position[2]:.3f}]
+                    - Orientation (rpy): [{rpy[0]:.3f}, {rpy[1]:.3f}, {rpy[2]:.3f}]\n=============\n""")
 
     def get_part_pose_from_sensor(self, part_type, part_color, verbose = False):
         """
@@ -134,71 +351,60 @@ class SensorRead():
         """
         # key : (type, color, pose)
 
-        for sensor_name, sensor_data in self.sensor_data.items():
-            for sdata in sensor_data:
-                if not "agv" in sensor_name:
-                    if sdata["is_part"]:
-                        if sdata["type"]==part_type and sdata["color"] == part_color:
-                            # Store the pose, tray_id and agv_num for processing the tray like pick and place
-                            pose = Pose()
-                            pose.position.x,pose.position.y, pose.position.z = sdata["pose"]
-                            quart = RPY_to_Quart(sdata["orientation"])
-                            (pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w) = quart 
-                            if verbose:
-                                self.node.get_logger().info(f"""\n==========================
-                - {COLOROFPARTS[sdata["color"]]} {TYPEOFPARTS[sdata["type"]]}
-                    - Position (xyz): [{sdata["pose"][0]:.3f}, {sdata["pose"][1]:.3f}, {sdata["pose"][2]:.3f}]
-                    - Orientation (rpy): [{sdata["orientation"][0]:.3f}, {sdata["orientation"][1]:.3f}, {sdata["orientation"][2]:.3f}]\n=============\n""")
-
-                            return {
-                                    "type" : sdata["type"],
-                                    "color" : sdata["color"],
-                                    "pose" : pose,
-                                    "kts" : 2 if pose.position.y > 0 else 1,
-                                    'agv_num': 0,
-                                    "bin_side" : "right_bins" if pose.position.x < 0 else "left_bins"
-                                    }
+        with self._lock:
+            self._refresh()
+            for sensor_name, rows in self.index.find_parts(part_type, part_color, (SOURCE_BINS, SOURCE_KTS)):
+                observations = self.sensor_data[sensor_name]
+
+                # Store the pose, tray_id and agv_num for processing the tray like pick and place
+                pose = self._pose_of(observations, rows[0])
+                if verbose:
+                    self._log_detection(f"{COLOROFPARTS[part_color]} {TYPEOFPARTS[part_type]}", observations, rows[0])
+
+                return {
+                        "type" : part_type,
+                        "color" : part_color,
+                        "pose" : pose,
+                        "kts" : 2 if pose.position.y > 0 else 1,
+                        'agv_num': 0,
+                        "bin_side" : "right_bins" if pose.position.x < 0 else "left_bins"
+                        }
 
         
     def get_part_pose_from_agv(self, ignored_parts, part_type, part_color, verbose = False):
         """
         Retrieve the order part pose from agv camera for handling edge cases of faulty gripper challenge
+
+        Args:
+            ignored_parts (PlacedPartIndex): Parts already placed on the AGVs, which are not returned
+            part_type: Type of the part
+            part_color: Color of the part
         """
-        for sensor_name, sensor_data in self.sensor_data.items():
-            for sdata in sensor_data:
-                flag = False
-                if "agv" in sensor_name:
-                   if sdata["is_part"]:
-                        if sdata["type"]==part_type and sdata["color"] == part_color:
-                            for parts in ignored_parts:
-                                if (parts['type']==sdata['type']) and (parts['color']==sdata['color']) and math.isclose(parts["part_place_pose"].position.x,sdata['pose'][0], rel_tol=0.01) and  math.isclose(parts["part_place_pose"].position.y,sdata['pose'][1],rel_tol=0.01): 
-                                    flag = True
-                                    break
-                                self.node.get_logger().info(f"""
-                                    - Part Place Pose (rpy): [{parts["part_place_pose"].position.x:.3f}, {parts["part_place_pose"].position.y:.3f}, {parts["part_place_pose"].position.z:.3f}]
-                                    """)
-                            
-                            # Store the pose, tray_id and agv_num for processing the tray like pick and place
-                            if not flag:
-                                pose = Pose()
-                                pose.position.x,pose.position.y, pose.position.z = sdata["pose"]
-                                quart = RPY_to_Quart(sdata["orientation"])
-                                (pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w) = quart 
-                                if verbose:
-                                        self.node.get_logger().info(f"""\n==========================
-                        - {COLOROFPARTS[sdata["color"]]} {TYPEOFPARTS[sdata["type"]]}
-                            - Part Position (xyz): [{sdata["pose"][0]:.3f}, {sdata["pose"][1]:.3f}, {sdata["pose"][2]:.3f}]
-                            - Orientation (rpy): [{sdata["orientation"][0]:.3f}, {sdata["orientation"][1]:.3f}, {sdata["orientation"][2]:.3f}]
-                            \n=============\n""")
-
-                                return {
-                                        "type" : sdata["type"],
-                                        "color" : sdata["color"],
-                                        "pose" : pose,
-                                        "kts" : 2 if pose.position.y > 0 else 1,
-                                        "agv_num": int(sensor_name.split('_')[0][3]),
-                                        "bin_side" : ""
-                                        }
+        with self._lock:
+            self._refresh()
+            for sensor_name, rows in self.index.find_parts(part_type, part_color, (SOURCE_AGV,)):
+                observations = self.sensor_data[sensor_name]
+                agv_num = self.index.agv_number_of(sensor_name)
+
+                # Drop the detections matching a part already placed on this AGV in one vectorized check
+                placed = ignored_parts.is_placed(agv_num, part_type, part_color, observations.pose[rows, 0:2])
+                if placed.all():
+                    continue
+                row = rows[int(np.argmin(placed))]
+
+                # Store the pose, tray_id and agv_num for processing the tray like pick and place
+                pose = self._pose_of(observations, row)
+                if verbose:
+                    self._log_detection(f"{COLOROFPARTS[part_color]} {TYPEOFPARTS[part_type]}", observations, row)
+
+                return {
+                        "type" : part_type,
+                        "color" : part_color,
+                        "pose" : pose,
+                        "kts" : 2 if pose.position.y > 0 else 1,
+                        "agv_num": agv_num,
+                        "bin_side" : ""
+                        }
 
     def get_tray_pose_from_sensor(self, tray_id, verbose= False):
         """
@@ -206,24 +412,18 @@ class SensorRead():
         """
         # key : (type, color, pose)
 
-        for sensor_name, sensor_data in self.sensor_data.items():
-            for sdata in sensor_data:
-                if 'agv' not in sensor_name:
-                    if not sdata["is_part"]:
-                        if sdata["tray_id"]==tray_id:
-                            # Store the pose, tray_id and agv_num for processing the tray like pick and place
-                            pose = Pose()
-                            pose.position.x,pose.position.y, pose.position.z = sdata["pose"]
-                            quart = RPY_to_Quart(sdata["orientation"])
-                            (pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w) = quart 
-                            if verbose:
-                                self.node.get_logger().info(f"""\n==========================
-                    - ID : {tray_id}
-                    - Position (xyz): [{sdata["pose"][0]:.3f}, {sdata["pose"][1]:.3f}, {sdata["pose"][2]:.3f}]
-                    - Orientation (rpy): [{sdata["orientation"][0]:.3f}, {sdata["orientation"][1]:.3f}, {sdata["orientation"][2]:.3f}]\n=============\n""")
-                            
-                            return {
-                                "tray_id" : tray_id,
-                                "pose" : pose,
-                                "kts" : 2 if pose.position.y > 0 else 1
-                            }
+        with self._lock:
+            self._refresh()
+            for sensor_name, rows in self.index.find_trays(tray_id, (SOURCE_BINS, SOURCE_KTS)):
+                observations = self.sensor_data[sensor_name]
+
+                # Store the pose, tray_id and agv_num for processing the tray like pick and place
+                pose = self._pose_of(observations, rows[0])
+                if verbose:
+                    self._log_detection(f"ID : {tray_id}", observations, rows[0])
+                
+                return {
+                    "tray_id" : tray_id,
+                    "pose" : pose,
+                    "kts" : 2 if pose.position.y > 0 else 1
+                }
@@ -0,0 +1,396 @@
+import zlib
+
+import numpy as np
+
+import pose_kernels as PK
+
+# Value stored in the integer columns when a field does not apply to a row
+# (color and type of a tray, tray_id of a part)
+NO_VALUE = -1
+
+
+class SensorObservations():
+    '''
+    Columnar store of the detections of one camera.
+
+    Every detection is one row of a set of typed arrays: the world pose
+    (position and quaternion share one (capacity, 7) array), color, type,
+    tray_id and is_part. Parts come first, then trays. The arrays are
+    preallocated and refreshed in place on every message, and only grow
+    when a frame holds more detections than the current capacity.
+    '''
+
+    __slots__ = ("count", "capacity", "pose", "color", "type", "tray_id", "is_part", "_local")
+
+    def __init__(self, capacity: int = 16):
+        '''
+        Initialize an empty store.
+
+        Args:
+            capacity (int): Number of rows to preallocate
+        '''
+        self.count = 0
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        '''
+        (Re)allocate the columns for at least `capacity` rows.
+        '''
+        self.capacity = max(capacity, 1)
+        self.pose = np.zeros((self.capacity, 7))
+        self.color = np.full(self.capacity, NO_VALUE, dtype=np.int16)
+        self.type = np.full(self.capacity, NO_VALUE, dtype=np.int16)
+        self.tray_id = np.full(self.capacity, NO_VALUE, dtype=np.int16)
+        self.is_part = np.zeros(self.capacity, dtype=bool)
+        # Scratch buffer for the poses in the sensor frame
+        self._local = np.zeros((self.capacity, 7))
+
+    @property
+    def position(self) -> np.ndarray:
+        '''
+        Returns:
+            np.ndarray: (count, 3) view on the world positions
+        '''
+        return self.pose[:self.count, 0:3]
+
+    @property
+    def quaternion(self) -> np.ndarray:
+        '''
+        Returns:
+            np.ndarray: (count, 4) view on the world orientations [x, y, z, w]
+        '''
+        return self.pose[:self.count, 3:7]
+
+    def rpy(self, row: int) -> np.ndarray:
+        '''
+        Roll, pitch and yaw of one row, computed on demand from its quaternion.
+
+        Returns:
+            np.ndarray: (3,) angles [roll, pitch, yaw] in radians
+        '''
+        return PK.quat_to_rpy(self.pose[row, 3:7])
+
+    def _write_poses(self, sensor_transform, part_poses, tray_poses) -> int:
+        '''
+        Overwrite the world poses and the row kinds with those of a new frame, the labels are left to the caller.
+
+        Returns:
+            int: Number of parts, the trays start at this row
+        '''
+        n_parts, n_trays = len(part_poses), len(tray_poses)
+        n = n_parts + n_trays
+        if n > self.capacity:
+            self._allocate(2 * n)
+
+        # Poses in the sensor frame, then one batched transform to the world frame
+        local = self._local[:n]
+        PK.pose_msgs_to_array(part_poses, out=local[:n_parts])
+        PK.pose_msgs_to_array(tray_poses, out=local[n_parts:])
+        PK.transform_poses(sensor_transform, local, out=self.pose[:n])
+
+        self.is_part[:n_parts] = True
+        self.is_part[n_parts:n] = False
+        self.tray_id[:n_parts] = NO_VALUE
+        self.color[n_parts:n] = NO_VALUE
+        self.type[n_parts:n] = NO_VALUE
+        self.count = n
+        return n_parts
+
+    def refresh(self, sensor_transform, part_poses, tray_poses):
+        '''
+        Overwrite the store with the detections of a new frame.
+
+        Args:
+            sensor_transform (np.ndarray): (4, 4) sensor-to-world transform
+            part_poses (Sequence[PartPoseMsg]): Parts seen by the camera
+            tray_poses (Sequence[KitTrayPoseMsg]): Trays seen by the camera
+        '''
+        n_parts = self._write_poses(sensor_transform, [p.pose for p in part_poses], [t.pose for t in tray_poses])
+        for i, part_pose in enumerate(part_poses):
+            self.color[i] = part_pose.part.color
+            self.type[i] = part_pose.part.type
+        for i, tray in enumerate(tray_poses, start=n_parts):
+            self.tray_id[i] = tray.id
+
+    def refresh_labeled(self, sensor_transform, frame, labels):
+        '''
+        Overwrite the store with the labeled detections of a basic logical camera frame.
+
+        Args:
+            sensor_transform (np.ndarray): (4, 4) sensor-to-world transform
+            frame (BasicLogicalCameraImageMsg): Frame of the camera, its poses are bare Poses
+            labels (LogicalCameraLabelsMsg): Labels of the frame, the parts and trays without a label are left out
+        '''
+        part_poses = [frame.part_poses[i] for i in labels.part_indices]
+        tray_poses = [frame.tray_poses[i] for i in labels.tray_indices]
+        n_parts = self._write_poses(sensor_transform, part_poses, tray_poses)
+        self.color[:n_parts] = labels.part_colors
+        self.type[:n_parts] = labels.part_types
+        self.tray_id[n_parts:self.count] = labels.tray_ids
+
+    def find_parts(self, part_type, part_color) -> np.ndarray:
+        '''
+        Rows of the parts matching a type and a color.
+
+        Returns:
+            np.ndarray: Row indices
+        '''
+        n = self.count
+        return np.flatnonzero(self.is_part[:n] & (self.type[:n] == part_type) & (self.color[:n] == part_color))
+
+    def find_trays(self, tray_id) -> np.ndarray:
+        '''
+        Rows of the trays matching an id.
+
+        Returns:
+            np.ndarray: Row indices
+        '''
+        n = self.count
+        return np.flatnonzero(~self.is_part[:n] & (self.tray_id[:n] == tray_id))
+
+
+def frame_fingerprint(msg, tolerance: float) -> tuple:
+    '''
+    Cheap content fingerprint of an AdvancedLogicalCameraImage message.
+
+    Positions and quaternions are quantized to `tolerance`, so two frames of a
+    static scene have the same fingerprint even with simulation noise.
+
+    Args:
+        msg (AdvancedLogicalCameraImageMsg): The message
+        tolerance (float): Quantization step of the pose components
+
+    Returns:
+        tuple: Fingerprint, equal for frames with the same content
+    '''
+    scale = 1.0 / tolerance
+
+    def quantized(pose):
+        p, q = pose.position, pose.orientation
+        return (round(p.x * scale), round(p.y * scale), round(p.z * scale),
+                round(q.x * scale), round(q.y * scale), round(q.z * scale), round(q.w * scale))
+
+    return (
+        quantized(msg.sensor_pose),
+        tuple((p.part.type, p.part.color) + quantized(p.pose) for p in msg.part_poses),
+        tuple((t.id,) + quantized(t.pose) for t in msg.tray_poses),
+    )
+
+
+def frame_key(msg, tolerance: float = 1e-4) -> int:
+    '''
+    Key of the poses of a basic logical camera frame.
+
+    BasicLogicalCameraImage has no header, so the perception nodes and
+    SensorRead, which receive the same frames, identify a frame by this key
+    to join it with its labels. Frames of a static scene share their key.
+
+    Args:
+        msg (BasicLogicalCameraImageMsg): The frame
+        tolerance (float): Quantization step of the pose components
+
+    Returns:
+        int: Unsigned 32-bit key, equal for frames with the same poses
+    '''
+    counts = np.array([len(msg.part_poses), len(msg.tray_poses)], dtype=np.int64)
+    poses = PK.pose_msgs_to_array([msg.sensor_pose, *msg.part_poses, *msg.tray_poses])
+    quantized = np.round(poses / tolerance).astype(np.int64)
+    return zlib.crc32(quantized.tobytes(), zlib.crc32(counts.tobytes()))
+
+
+# Source classes of the cameras, used to split the index
+SOURCE_BINS = "bins"
+SOURCE_KTS = "kts"
+SOURCE_AGV = "agv"
+
+
+def source_class(sensor_name: str) -> str:
+    '''
+    Source class of a camera from its name.
+
+    Args:
+        sensor_name (str): Name of the sensor, e.g. "agv1_camera" or "kts2_camera"
+
+    Returns:
+        str: SOURCE_AGV, SOURCE_KTS or SOURCE_BINS
+    '''
+    if "agv" in sensor_name:
+        return SOURCE_AGV
+    if "kts" in sensor_name:
+        return SOURCE_KTS
+    return SOURCE_BINS
+
+
+class DetectionIndex():
+    '''
+    Hash index over the stores of all cameras.
+
+    Parts are indexed by (source, type, color) and trays by (source, tray_id).
+    Each key maps to the rows of every sensor holding a match, so a lookup
+    costs one dictionary access plus the number of candidates. The entries of
+    a sensor are replaced whenever its store is refreshed.
+    '''
+
+    def __init__(self):
+        '''
+        Initialize an empty index.
+        '''
+        # (source, type, color) -> {sensor_name: rows}
+        self._parts = {}
+        # (source, tray_id) -> {sensor_name: rows}
+        self._trays = {}
+        # sensor_name -> keys of self._parts and self._trays holding rows of that sensor
+        self._sensor_keys = {}
+        # sensor_name -> source class, computed once per sensor
+        self._sources = {}
+
+    def source_of(self, sensor_name: str) -> str:
+        '''
+        Cached source class of a sensor.
+        '''
+        source = self._sources.get(sensor_name)
+        if source is None:
+            source = self._sources[sensor_name] = source_class(sensor_name)
+        return source
+
+    def agv_number_of(self, sensor_name: str) -> int:
+        '''
+        AGV number of an AGV camera, e.g. 3 for "agv3_camera".
+        '''
+        return int(sensor_name.split('_')[0][3])
+
+    def remove(self, sensor_name: str):
+        '''
+        Remove all the entries of a sensor.
+        '''
+        part_keys, tray_keys = self._sensor_keys.pop(sensor_name, ((), ()))
+        for table, keys in ((self._parts, part_keys), (self._trays, tray_keys)):
+            for key in keys:
+                entries = table[key]
+                del entries[sensor_name]
+                if not entries:
+                    del table[key]
+
+    def update(self, sensor_name: str, observations: SensorObservations):
+        '''
+        Replace the entries of a sensor with the content of its refreshed store.
+
+        Args:
+            sensor_name (str): Name of the sensor
+            observations (SensorObservations): The store of the sensor
+        '''
+        self.remove(sensor_name)
+        source = self.source_of(sensor_name)
+
+        # Group the rows of the store by key
+        parts, trays = {}, {}
+        n = observations.count
+        for row, (is_part, part_type, color, tray_id) in enumerate(zip(
+                observations.is_part[:n].tolist(), observations.type[:n].tolist(),
+                observations.color[:n].tolist(), observations.tray_id[:n].tolist())):
+            if is_part:
+                parts.setdefault((source, part_type, color), []).append(row)
+            else:
+                trays.setdefault((source, tray_id), []).append(row)
+
+        for table, groups in ((self._parts, parts), (self._trays, trays)):
+            for key, rows in groups.items():
+                table.setdefault(key, {})[sensor_name] = rows
+        self._sensor_keys[sensor_name] = (tuple(parts), tuple(trays))
+
+    def find_parts(self, part_type, part_color, sources):
+        '''
+        Candidate rows of the parts matching a type and a color.
+
+        Args:
+            part_type (int): Type of the part
+            part_color (int): Color of the part
+            sources (Iterable[str]): Source classes to search
+
+        Returns:
+            Iterator[Tuple[str, List[int]]]: (sensor_name, rows) pairs
+        '''
+        for source in sources:
+            yield from self._parts.get((source, part_type, part_color), {}).items()
+
+    def find_trays(self, tray_id, sources):
+        '''
+        Candidate rows of the trays matching an id.
+
+        Args:
+            tray_id (int): ID of the tray
+            sources (Iterable[str]): Source classes to search
+
+        Returns:
+            Iterator[Tuple[str, List[int]]]: (sensor_name, rows) pairs
+        '''
+        for source in sources:
+            yield from self._trays.get((source, tray_id), {}).items()
+
+
+class PlacedPartIndex():
+    '''
+    Positions of the parts already placed on the AGVs.
+
+    Positions are bucketed by (agv_num, type, color), so a query only looks at
+    the parts of the same kind placed on the same AGV, and the bucket is
+    matched against all the detections of a camera in one vectorized check.
+    Two positions match when x and y are both within `rel_tol`, with the
+    semantics of math.isclose.
+    '''
+
+    def __init__(self, rel_tol: float = 0.01):
+        '''
+        Initialize an empty index.
+
+        Args:
+            rel_tol (float): Relative tolerance on x and y
+        '''
+        self.rel_tol = rel_tol
+        # (agv_num, type, color) -> (n, 2) array of x, y positions
+        self._positions = {}
+
+    def __len__(self) -> int:
+        return sum(len(positions) for positions in self._positions.values())
+
+    def add(self, agv_num, part_type, part_color, pose):
+        '''
+        Record a part placed on an AGV.
+
+        Args:
+            agv_num (int): AGV the part was placed on
+            part_type (int): Type of the part
+            part_color (int): Color of the part
+            pose (Pose): World pose where the part was placed
+        '''
+        if pose is None:
+            return
+        key = (agv_num, part_type, part_color)
+        position = np.array([[pose.position.x, pose.position.y]])
+        placed = self._positions.get(key)
+        self._positions[key] = position if placed is None else np.vstack((placed, position))
+
+    def is_placed(self, agv_num, part_type, part_color, positions) -> np.ndarray:
+        '''
+        Check which detections are parts already placed.
+
+        Args:
+            agv_num (int): AGV seen by the camera
+            part_type (int): Type of the detected parts
+            part_color (int): Color of the detected parts
+            positions (array_like): (M, 2) or (M, 3) world positions of the detections
+
+        Returns:
+            np.ndarray: (M,) boolean mask, True for the detections matching a placed part
+        '''
+        positions = np.asarray(positions, dtype=np.float64)
+        placed = self._positions.get((agv_num, part_type, part_color))
+        if placed is None:
+            return np.zeros(len(positions), dtype=bool)
+
+        # (M, 1, 2) against (1, n, 2), same test as math.isclose(a, b, rel_tol=rel_tol)
+        a = positions[:, None, 0:2]
+        b = placed[None, :, :]
+        close = np.abs(a - b) <= self.rel_tol * np.maximum(np.abs(a), np.abs(b))
+        return close.all(axis=2).any(axis=1)
@@ -0,0 +1,170 @@
+import math
+
+import numpy as np
+
+import pose_kernels as PK
+
+
+def parse_angle(value) -> float:
+    '''
+    Parse an angle of a sensor YAML pose block, e.g. 0, 1.57, "pi", "-pi/2" or "2*pi/3".
+
+    Args:
+        value (float or str): Angle as written in the YAML file
+
+    Returns:
+        float: Angle in radians
+    '''
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    expr = str(value).replace(' ', '')
+    sign = -1.0 if expr.startswith('-') else 1.0
+    expr = expr.lstrip('+-')
+    if 'pi' not in expr:
+        return sign * float(expr)
+
+    coefficient, _, divisor = expr.partition('pi')
+    coefficient = float(coefficient.rstrip('*')) if coefficient else 1.0
+    divisor = float(divisor.lstrip('/')) if divisor else 1.0
+    return sign * coefficient * math.pi / divisor
+
+
+def yaml_pose_to_array(pose_block) -> np.ndarray:
+    '''
+    Convert a sensor YAML pose block ({xyz: [...], rpy: [...]}) to a pose array.
+
+    Args:
+        pose_block (dict): The pose block of one sensor
+
+    Returns:
+        np.ndarray: (7,) pose [x, y, z, qx, qy, qz, qw]
+    '''
+    xyz = [float(v) for v in pose_block.get("xyz", [0.0, 0.0, 0.0])]
+    rpy = [parse_angle(v) for v in pose_block.get("rpy", [0.0, 0.0, 0.0])]
+    return np.concatenate([xyz, PK.rpy_to_quat(rpy)])
+
+
+class SensorTransformCache():
+    '''
+    Cache of the sensor-to-world transform of every fixed camera.
+
+    Transforms are seeded from the pose blocks of the sensor YAML file and
+    confirmed against the sensor_pose of the first message of each sensor.
+    After that, a message only costs a comparison of its sensor_pose with the
+    cached one, and the transform is rebuilt only if the reported pose changes.
+    '''
+
+    def __init__(self, sensors_config: dict, atol: float = 1e-3, logger=None):
+        '''
+        Initialize the cache with the poses of the sensor configuration.
+
+        Args:
+            sensors_config (dict): The "sensors" mapping of the sensor YAML file
+            atol (float): Tolerance under which two sensor poses are considered equal
+            logger: Optional ROS logger used to report invalidated transforms
+        '''
+        self._atol = atol
+        self._logger = logger
+
+        # name -> sensor pose the cached transform was built from, as a tuple and as an array
+        self._keys = {}
+        self._poses = {}
+        # name -> (4, 4) sensor-to-world transform
+        self._matrices = {}
+        # name -> True once a message confirmed the cached transform
+        self._confirmed = {}
+
+        self._hits = {}
+        self._misses = {}
+        self._invalidations = {}
+
+        for name, info in sensors_config.items():
+            self._hits[name] = 0
+            self._misses[name] = 0
+            self._invalidations[name] = 0
+            if info.get("pose") is not None:
+                self._store(name, yaml_pose_to_array(info["pose"]))
+                self._confirmed[name] = False
+
+    def _store(self, name, pose):
+        '''
+        Build and store the transform of a sensor from its pose.
+
+        Args:
+            name (str): Name of the sensor
+            pose (array_like): (7,) pose of the sensor in the world frame
+        '''
+        pose = np.asarray(pose, dtype=np.float64)
+        self._keys[name] = tuple(pose.tolist())
+        self._poses[name] = pose
+        self._matrices[name] = PK.pose_to_matrix(pose)
+
+    def _same_pose(self, a, b) -> bool:
+        '''
+        Check if two poses are equal within tolerance, q and -q being the same rotation.
+        '''
+        if not np.allclose(a[0:3], b[0:3], rtol=0.0, atol=self._atol):
+            return False
+        return (np.allclose(a[3:7], b[3:7], rtol=0.0, atol=self._atol)
+                or np.allclose(a[3:7], -b[3:7], rtol=0.0, atol=self._atol))
+
+    def get(self, name, sensor_pose) -> np.ndarray:
+        '''
+        Return the sensor-to-world transform of a sensor for one message.
+
+        Args:
+            name (str): Name of the sensor
+            sensor_pose (Pose): The sensor_pose reported by the message
+
+        Returns:
+            np.ndarray: (4, 4) sensor-to-world transform
+        '''
+        p, q = sensor_pose.position, sensor_pose.orientation
+        key = (p.x, p.y, p.z, q.x, q.y, q.z, q.w)
+        if name not in self._hits:
+            self._hits[name] = self._misses[name] = self._invalidations[name] = 0
+
+        # Fast path, the camera reports exactly the pose it reported before
+        if self._keys.get(name) == key:
+            self._hits[name] += 1
+            self._confirmed[name] = True
+            return self._matrices[name]
+
+        reported = np.array(key)
+        cached = self._poses.get(name)
+        if cached is not None and self._same_pose(cached, reported):
+            self._hits[name] += 1
+            if not self._confirmed[name]:
+                # First message confirms the YAML seed, keep the exact reported pose from now on
+                self._confirmed[name] = True
+                self._store(name, reported)
+            return self._matrices[name]
+
+        # Unknown sensor or the sensor moved
+        self._misses[name] += 1
+        if cached is not None and self._confirmed[name]:
+            self._invalidations[name] += 1
+            if self._logger is not None:
+                self._logger.warn(f"Pose of sensor {name} changed, refreshing its cached transform")
+        self._confirmed[name] = True
+        self._store(name, reported)
+        return self._matrices[name]
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Hit, miss and invalidation counters of every sensor.
+
+        Returns:
+            dict: name -> {"hits", "misses", "invalidations", "confirmed"}
+        '''
+        return {
+            name: {
+                "hits": self._hits[name],
+                "misses": self._misses[name],
+                "invalidations": self._invalidations[name],
+                "confirmed": self._confirmed.get(name, False),
+            }
+            for name in self._hits
+        }
@@ -0,0 +1,112 @@
+'''
+Cache of the labels of the parts sitting in the bin slots.
+
+The parts of the bins sit in fixed slots (8 bins of 9 slots) and only move
+when the robot picks or places one. A slot is identified by the position of
+its part in the logical camera frame, so the occupancy reported by the
+logical camera is enough to tell which slots kept their part, which were
+emptied and which were filled, without looking at the RGB image.
+'''
+import numpy as np
+
+from detection_matching import greedy_assignment, UNASSIGNED
+
+# Bins seen by one bin camera, and slots of a bin
+BINS_PER_CAMERA = 4
+SLOTS_PER_BIN = 9
+
+# Half size (m) of the square of a slot, a third of the side of a bin
+SLOT_HALF_SIZE = 0.1
+
+
+class SlotCache():
+    '''
+    Labels of the occupied slots of one camera, keyed by slot position.
+    '''
+
+    def __init__(self, tolerance: float = 0.05, capacity: int = BINS_PER_CAMERA * SLOTS_PER_BIN):
+        '''
+        Args:
+            tolerance (float): Maximum distance (m) between a part and the position of its slot
+            capacity (int): Maximum number of cached slots
+        '''
+        self._tolerance = tolerance
+        self.capacity = capacity
+        # (K, 3) positions of the occupied slots and their (color, type, confidence) labels
+        self._positions = np.empty((0, 3))
+        self._labels = []
+        # Parts of the last lookup that had no cached label and were not labeled since
+        self.pending = 0
+
+        # Counters reported by the stats property
+        self._hits = 0
+        self._misses = 0
+        self._invalidated = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Cached slots, slots waiting for a label, cache hits and misses and invalidated slots
+        '''
+        return {
+            "slots": len(self._labels),
+            "pending": self.pending,
+            "hits": self._hits,
+            "misses": self._misses,
+            "invalidated": self._invalidated,
+        }
+
+    def lookup(self, points) -> list:
+        '''
+        Labels of the parts of a logical camera frame.
+
+        The cached slots without a part in the frame were emptied and are
+        invalidated, the parts without a cached slot are counted as pending.
+
+        Args:
+            points (array_like): (N, 3) positions of the parts in the logical camera frame
+
+        Returns:
+            List[Tuple[int, int, float]]: (color, type, confidence) of every part, None if not cached
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        match = greedy_assignment(points, self._positions, self._tolerance)
+        found = match != UNASSIGNED
+
+        kept = np.zeros(len(self._labels), dtype=bool)
+        kept[match[found]] = True
+        if not kept.all():
+            self._invalidated += int((~kept).sum())
+            self._positions = self._positions[kept]
+            self._labels = [label for label, keep in zip(self._labels, kept.tolist()) if keep]
+            # Indices of the kept slots after the removal
+            match[found] = (np.cumsum(kept) - 1)[match[found]]
+
+        hits = int(found.sum())
+        self._hits += hits
+        self._misses += len(points) - hits
+        self.pending = len(points) - hits
+        return [self._labels[index] if index != UNASSIGNED else None for index in match.tolist()]
+
+    def add(self, point, label):
+        '''
+        Cache the label of a slot, replacing the label of the slot if it is already cached.
+
+        Args:
+            point (array_like): (3,) position of the part in the logical camera frame
+            label (Tuple[int, int, float]): (color, type, confidence) of the part
+        '''
+        point = np.asarray(point, dtype=np.float64).reshape(1, 3)
+        index = greedy_assignment(point, self._positions, self._tolerance)[0]
+        if index != UNASSIGNED:
+            self._labels[index] = label
+            return
+        if len(self._labels) == self.capacity:
+            return
+        self._positions = np.concatenate((self._positions, point))
+        self._labels.append(label)
+        self.pending = max(self.pending - 1, 0)
@@ -0,0 +1,251 @@
+'''
+Tray ID detection of the kts cameras from the ArUco markers of the kit trays.
+
+The logical camera gives the pose of every tray but not its ID. Each tray
+occupies a slot of the kts table, and the ID of a slot is read once from
+the marker in a crop of the RGB image around the projected tray, then served
+from a cache until the slot is emptied. As trays stay on the tables for
+minutes, most frames only cost a cache lookup.
+'''
+import cv2
+import numpy as np
+
+import rclpy
+from rclpy.node import Node
+from sensor_msgs.msg import Image
+from ariac_msgs.msg import BasicLogicalCameraImage
+from robot_commander_msgs.msg import LogicalCameraLabels
+
+from camera_projection import CameraProjection, load_config
+from debug_images import FrameDisplay, declare_display_parameters
+from frame_labels import FrameLabeler, LABELS_QOS, labels_topic
+from frame_sync import stamp_of, DetectionBuffer
+from image_ingest import ImageReader
+
+# Half size (m) of the square searched for the marker around the center of a tray
+TRAY_HALF_SIZE = 0.25
+
+# Size (m) of the grid on which tray positions are quantized to identify a slot
+SLOT_GRID = 0.05
+
+
+class ArucoTrayPipeline():
+    '''
+    Per-slot tray ID cache of one kts camera.
+    '''
+
+    def __init__(self, projection: CameraProjection, logger, crop_scale: int = 4):
+        '''
+        Args:
+            projection (CameraProjection): Projection of the logical camera frame to the RGB image
+            logger: ROS logger of the node hosting the pipeline
+            crop_scale (int): Upscaling of the crops before detection, the markers are small in the image
+        '''
+        self.projection = projection
+        self._logger = logger
+        self._crop_scale = crop_scale
+
+        # Built once, detectMarkers is the only per-crop cost
+        dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+        self._detector = cv2.aruco.ArucoDetector(dictionary, cv2.aruco.DetectorParameters())
+
+        # slot -> tray ID
+        self.slot_ids = {}
+        # slot -> (x1, y1, x2, y2) crop of the last detection, for the debug images
+        self.slot_rois = {}
+        self.labeler = FrameLabeler()
+
+        # Counters reported by the stats property
+        self._cache_hits = 0
+        self._detections = 0
+        self._failed_detections = 0
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Occupied slots, cache hits and detections run
+        '''
+        return {
+            "slots": len(self.slot_ids),
+            "cache_hits": self._cache_hits,
+            "detections": self._detections,
+            "failed_detections": self._failed_detections,
+        }
+
+    @staticmethod
+    def slot_of(pose) -> tuple:
+        '''
+        Slot of a tray, its (y, z) position in the logical camera frame quantized to SLOT_GRID.
+
+        Args:
+            pose (Pose): Pose of the tray in the logical camera frame
+
+        Returns:
+            Tuple[int, int]: The slot
+        '''
+        return (round(pose.position.y / SLOT_GRID), round(pose.position.z / SLOT_GRID))
+
+    def needs_image(self, msg) -> bool:
+        '''
+        Args:
+            msg (BasicLogicalCameraImage): Frame of the logical camera
+
+        Returns:
+            bool: True if a tray of the frame is in a slot without a cached ID
+        '''
+        return any(self.slot_of(pose) not in self.slot_ids for pose in msg.tray_poses)
+
+    def _roi(self, pose, shape):
+        '''
+        Pixel box around a tray, clipped to the image.
+
+        Returns:
+            Tuple[int, int, int, int]: x1, y1, x2, y2, None if the box is outside the image
+        '''
+        p = pose.position
+        return self.projection.box((p.x, p.y, p.z), TRAY_HALF_SIZE, shape)
+
+    def _detect(self, image, roi):
+        '''
+        Read the marker closest to the center of a crop.
+
+        Returns:
+            int: ID of the marker, None if no marker was found
+        '''
+        x1, y1, x2, y2 = roi
+        gray = cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, None, fx=self._crop_scale, fy=self._crop_scale, interpolation=cv2.INTER_LINEAR)
+        corners, ids, _ = self._detector.detectMarkers(gray)
+        self._detections += 1
+        if ids is None:
+            self._failed_detections += 1
+            return None
+
+        center = np.array(gray.shape[1::-1]) / 2.0
+        distances = [np.linalg.norm(corner[0].mean(axis=0) - center) for corner in corners]
+        return int(ids[int(np.argmin(distances))][0])
+
+    def label_frame(self, msg, image) -> LogicalCameraLabels:
+        '''
+        Label the trays of a logical camera frame with their IDs.
+
+        Slots that are no longer occupied leave the cache. The ID of a slot not
+        in the cache is read from the image, and the trays whose ID could not
+        be read are left out of the labels.
+
+        Args:
+            msg (BasicLogicalCameraImage): Frame of the logical camera
+            image (np.ndarray): Latest BGR image of the RGB camera, None if there is none
+
+        Returns:
+            LogicalCameraLabels: Labels of the trays, None if the same as the last ones
+        '''
+        slots = [self.slot_of(pose) for pose in msg.tray_poses]
+        for slot in set(self.slot_ids) - set(slots):
+            del self.slot_ids[slot]
+            self.slot_rois.pop(slot, None)
+
+        trays = []
+        for index, (pose, slot) in enumerate(zip(msg.tray_poses, slots)):
+            tray_id = self.slot_ids.get(slot)
+            if tray_id is not None:
+                self._cache_hits += 1
+            elif image is not None:
+                roi = self._roi(pose, image.shape)
+                if roi is not None:
+                    tray_id = self._detect(image, roi)
+                if tray_id is not None:
+                    self._logger.info(f"Tray {tray_id} found in slot {slot}")
+                    self.slot_ids[slot] = tray_id
+                    self.slot_rois[slot] = roi
+            if tray_id is not None:
+                trays.append((index, tray_id))
+        return self.labeler.encode(msg, trays=trays)
+
+    def draw(self, image):
+        '''
+        Draw the crops and IDs of the cached slots on an image.
+
+        Args:
+            image (np.ndarray): BGR image, modified in place
+        '''
+        for slot, (x1, y1, x2, y2) in list(self.slot_rois.items()):
+            cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            cv2.putText(image, str(self.slot_ids.get(slot, "?")), (x1, y1), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+
+
+class ArucoTrayNode(Node):
+    '''
+    Node labeling the trays seen by one kts camera.
+    '''
+
+    def __init__(self, node_name: str, camera_name: str):
+        '''
+        Initialize the node and its subscriptions.
+
+        Args:
+            node_name (str): Name of the node
+            camera_name (str): Name of the kts RGB camera, its logical camera being "<camera_name>_logical"
+        '''
+        super().__init__(node_name)
+        self.reader = ImageReader()
+        self.camera_name = camera_name
+
+        max_image_age = self.declare_parameter("max_image_age", 2.0).value
+        headless, debug_image_rate = declare_display_parameters(self)
+        projection = CameraProjection.from_config(
+            camera_name, load_config("new_sensors")["sensors"], load_config("camera_intrinsics"))
+        self.pipeline = ArucoTrayPipeline(projection, self.get_logger())
+        self.display = FrameDisplay(self, camera_name, headless, debug_image_rate)
+        # Latest RGB image message, not used once older than max_image_age
+        self.images = DetectionBuffer(capacity=1, max_age=max_image_age)
+
+        self.publisher_ = self.create_publisher(
+            LogicalCameraLabels, labels_topic(camera_name + "_logical"), LABELS_QOS)
+        self.subscription = self.create_subscription(
+            Image, f"/ariac/sensors/{camera_name}/rgb_image", self.callback, 10)
+        self.subscription_ = self.create_subscription(
+            BasicLogicalCameraImage, f"/ariac/sensors/{camera_name}_logical/image", self.listener_callback,
+            rclpy.qos.qos_profile_sensor_data)
+        self.create_timer(60.0, self.log_stats)
+
+    def log_stats(self):
+        '''
+        Log the slot cache counters.
+        '''
+        self.get_logger().info(f"{self.camera_name} trays: {self.pipeline.stats}")
+        self.get_logger().info(f"{self.camera_name} images: {self.reader.stats}")
+        self.get_logger().info(f"{self.camera_name} labels: {self.pipeline.labeler.stats}")
+
+    def listener_callback(self, msg):
+        '''
+        Label a logical camera frame and publish its labels if they changed.
+
+        The latest RGB image is only converted when a slot needs its tray ID read.
+        '''
+        self.images.expire(stamp_of(msg, self.get_clock()))
+        image_msg = self.images.latest()
+        image = None
+        if image_msg is not None and self.pipeline.needs_image(msg):
+            try:
+                image = self.reader.to_bgr(image_msg)
+            except Exception as e:
+                self.get_logger().error('Error converting image: %s' % str(e))
+        labels = self.pipeline.label_frame(msg, image)
+        if labels is not None:
+            self.publisher_.publish(labels)
+
+    def callback(self, msg):
+        '''
+        Keep the latest RGB image message, markers are only read when a slot needs it.
+        '''
+        self.images.append(stamp_of(msg, self.get_clock()), msg)
+        if not self.display.wants_frame():
+            return
+        try:
+            image = self.reader.to_bgr(msg)
+        except Exception as e:
+            self.get_logger().error('Error converting image: %s' % str(e))
+            return
+        self.display.show(image, self.pipeline.draw)
@@ -1,7 +1,8 @@
 import math
 from typing import List, Tuple
 from dataclasses import dataclass
-import PyKDL
+import pose_kernels as PK
+from order_model import OrderRecord
 from geometry_msgs.msg import (
     Pose,
     PoseStamped, 
@@ -40,9 +41,10 @@ QuadrantsOffset = {
 
 def Mult_pose(Pose_1: Pose, Pose_2: Pose) -> Pose:
     '''
-    Using KDL to multiply two poses together.
+    Multiply two poses together.
 
-    This function takes two Pose objects and calculates the result of multiplying them together using KDL (Kinematics and Dynamics Library).
+    This function takes two Pose objects and calculates the result of multiplying them together
+    with the NumPy pose kernels, which follow the KDL (Kinematics and Dynamics Library) conventions.
 
     Args:
         Pose_1 (Pose): Pose of the first frame
@@ -52,60 +54,35 @@ def Mult_pose(Pose_1: Pose, Pose_2: Pose) -> Pose:
         Final_Pose (Pose): Pose of the resulting frame
     '''
 
-    # Extract orientation and position components from Pose_1
-    Orientation_Frame_1 = Pose_1.orientation
-    Frame1 = PyKDL.Frame(
-        PyKDL.Rotation.Quaternion(Orientation_Frame_1.x, Orientation_Frame_1.y, Orientation_Frame_1.z, Orientation_Frame_1.w),
-        PyKDL.Vector(Pose_1.position.x, Pose_1.position.y, Pose_1.position.z))
-
-    # Extract orientation and position components from Pose_2
-    Orientation_Frame_2 = Pose_2.orientation
-    Frame2 = PyKDL.Frame(
-        PyKDL.Rotation.Quaternion(Orientation_Frame_2.x, Orientation_Frame_2.y, Orientation_Frame_2.z, Orientation_Frame_2.w),
-        PyKDL.Vector(Pose_2.position.x, Pose_2.position.y, Pose_2.position.z))
-
     # Multiply the two frames together to get the resulting frame
-    Resulting_Frame3 = Frame1 * Frame2
-
-    # Extract position components from the resulting frame and assign to Final_pose
-    Final_pose = Pose()
-    Final_pose.position.x = Resulting_Frame3.p.x()
-    Final_pose.position.y = Resulting_Frame3.p.y()
-    Final_pose.position.z = Resulting_Frame3.p.z()
-
-    # Extract quaternion components from the resulting frame and assign to Final_pose
-    Quaternion_orientation = Resulting_Frame3.M.GetQuaternion()
-    Final_pose.orientation.x = Quaternion_orientation[0]
-    Final_pose.orientation.y = Quaternion_orientation[1]
-    Final_pose.orientation.z = Quaternion_orientation[2]
-    Final_pose.orientation.w = Quaternion_orientation[3]
+    Resulting_Frame3 = PK.mult_pose(PK.pose_msg_to_array(Pose_1), PK.pose_msg_to_array(Pose_2))
 
     # Return the final pose
-    return Final_pose
+    return PK.array_to_pose_msg(Resulting_Frame3, Pose())
 
 def Quart_to_RPY(quart: Quaternion) -> Tuple[float, float, float]:
     ''' 
-    Use KDL to convert a quaternion to euler angles roll, pitch, yaw.
+    Convert a quaternion to euler angles roll, pitch, yaw (KDL convention).
     Args:
         q (Quaternion): quaternion to convert
     Returns:
         Tuple[float, float, float]: roll, pitch, yaw
     '''
     
-    RPY = PyKDL.Rotation.Quaternion(quart.x, quart.y, quart.z, quart.w)
-    return RPY.GetRPY()
+    RPY = PK.quat_to_rpy((quart.x, quart.y, quart.z, quart.w))
+    return tuple(RPY.tolist())
 
 def RPY_to_Quart(rpy) -> Tuple[float, float, float, float]:
     ''' 
-    Use KDL to convert a quaternion to euler angles roll, pitch, yaw.
+    Convert euler angles roll, pitch, yaw to a quaternion (KDL convention).
     Args:
-        q (Quaternion): quaternion to convert
+        rpy (Tuple[float, float, float]): roll, pitch, yaw to convert
     Returns:
-        Tuple[float, float, float]: roll, pitch, yaw
+        Tuple[float, float, float, float]: x, y, z, w
     '''
     
-    RPY = PyKDL.Rotation.RPY(rpy[0],rpy[1],rpy[2])  #Quaternion(quart.x, quart.y, quart.z, quart.w)
-    return RPY.GetQuaternion()
+    Quart = PK.rpy_to_quat(rpy)
+    return tuple(Quart.tolist())
 
 def RAD_TO_DEGREE(radians: float) -> str:
     '''
@@ -237,4 +214,16 @@ class Order:
                                           msg.kitting_task.destination,
                                           msg.kitting_task.parts)
         else:
-            self.order_task = None
\ No newline at end of file
+            self.order_task = None
+
+    def to_record(self) -> OrderRecord:
+        ''' 
+        Convert the order to a frozen OrderRecord that holds no ROS message.
+
+        Returns:
+            OrderRecord: The compact, picklable form of the order.
+
+        Raises:
+            ValueError: The order is not a kitting order.
+        '''
+        return OrderRecord.from_order(self)
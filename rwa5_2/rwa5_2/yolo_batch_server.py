@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+'''
+Single YOLO inference server for all the bin cameras.
+
+The RGB callbacks only keep the latest frame of each camera. A timer
+collects these frames and runs them through one model as a single batched
+call per cycle, then the detections are handed back to the pipeline of each
+camera, which labels its logical camera frames and publishes their labels on
+the same topics as the one-camera nodes.
+'''
+import threading
+from functools import partial
+
+import rclpy
+from rclpy.node import Node
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup, ReentrantCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.qos import qos_profile_sensor_data
+from sensor_msgs.msg import Image
+from ariac_msgs.msg import BasicLogicalCameraImage
+from robot_commander_msgs.msg import LogicalCameraLabels
+
+from camera_projection import CameraProjection, load_config
+from debug_images import FrameDisplay, declare_display_parameters
+from frame_labels import LABELS_QOS
+from frame_sync import stamp_of
+from image_ingest import ImageReader
+from yolo_common import (
+    BIN_CAMERAS,
+    BinCameraPipeline,
+    classify_images,
+    declare_models,
+    declare_pipeline_parameters,
+    draw_detections
+)
+
+
+class YoloBatchServer(Node):
+    def __init__(self, node_name: str = "yolo_batch_server"):
+        '''
+        Load the model once and set up the pipelines of the bin cameras.
+
+        Parameters of the node:
+            mode, model_path, classifier_path, backend, input_size, num_threads -- See yolo_common.declare_models
+            cameras -- Bin cameras served, from yolo_common.BIN_CAMERAS
+            rate -- Inference cycles per second
+            max_sync_skew, max_match_distance, change_threshold, refresh_period, slot_cache -- See yolo_common.declare_pipeline_parameters
+            headless, debug_image_rate -- See debug_images.declare_display_parameters
+        '''
+        super().__init__(node_name)
+
+        self.detector, self.classifier = declare_models(self)
+        cameras = self.declare_parameter("cameras", list(BIN_CAMERAS)).value
+        rate = self.declare_parameter("rate", 10.0).value
+        pipeline_parameters = declare_pipeline_parameters(self)
+        headless, debug_image_rate = declare_display_parameters(self)
+
+        self.pipelines = {}
+        self.displays = {}
+        # camera name -> publisher of the labels of its frames, or any object with a publish method
+        self.outputs = {}
+        # Used by the inference cycle only, so the conversion buffer of a camera is never shared between threads
+        self._readers = {}
+        # camera name -> (stamp, latest RGB image message) not yet run through the model
+        self._latest = {}
+        self._latest_lock = threading.Lock()
+        # Inference runs in its own group, so frames keep being received and stamped meanwhile
+        self._inference_group = MutuallyExclusiveCallbackGroup()
+        self._frames_group = ReentrantCallbackGroup()
+
+        # Counters reported by the stats property
+        self._frames_received = 0
+        self._frames_dropped = 0
+        self._frames_inferred = 0
+        self._cycles = 0
+
+        sensors_config = load_config("new_sensors")["sensors"]
+        intrinsics_config = load_config("camera_intrinsics")
+        for camera_name in cameras:
+            projection = CameraProjection.from_config(camera_name, sensors_config, intrinsics_config)
+            pipeline = BinCameraPipeline(
+                camera_name, projection, self.get_logger(), classifier=self.classifier, **pipeline_parameters)
+            self.pipelines[camera_name] = pipeline
+            self._readers[camera_name] = ImageReader()
+            self.displays[camera_name] = FrameDisplay(self, camera_name, headless, debug_image_rate)
+            self.outputs[camera_name] = self.create_publisher(
+                LogicalCameraLabels, pipeline.output_topic, LABELS_QOS)
+            self.create_subscription(
+                Image, pipeline.rgb_topic, partial(self._rgb_callback, camera_name=camera_name), 10,
+                callback_group=self._frames_group)
+            self.create_subscription(
+                BasicLogicalCameraImage, pipeline.logical_topic,
+                partial(self._logical_callback, camera_name=camera_name), qos_profile_sensor_data,
+                callback_group=self._frames_group)
+
+        self.create_timer(1.0 / rate, self._inference_cycle, callback_group=self._inference_group)
+        self.create_timer(60.0, self._log_stats)
+        self.get_logger().info(f"YOLO batch server started for {', '.join(cameras)}")
+
+    @property
+    def stats(self) -> dict:
+        '''
+        Returns:
+            dict: Frames received, frames replaced before an inference cycle, frames run through the model and inference cycles
+        '''
+        return {
+            "frames_received": self._frames_received,
+            "frames_dropped": self._frames_dropped,
+            "frames_inferred": self._frames_inferred,
+            "cycles": self._cycles,
+        }
+
+    def _log_stats(self):
+        '''
+        Log the inference counters and the occupancy of the buffers of every camera.
+        '''
+        self.get_logger().info(f"Inference: {self.stats}")
+        for name, pipeline in self.pipelines.items():
+            self.get_logger().info(f"{name} buffers: {pipeline.sync.stats}")
+            self.get_logger().info(f"{name} inference: {pipeline.scheduler.stats}")
+            self.get_logger().info(f"{name} images: {self._readers[name].stats}")
+            self.get_logger().info(f"{name} labels: {pipeline.labeler.stats}")
+            if pipeline.slot_cache is not None:
+                self.get_logger().info(f"{name} slots: {pipeline.slot_cache.stats}")
+
+    def _rgb_callback(self, msg, camera_name):
+        '''
+        Keep the latest RGB frame of a camera, older frames not yet processed are replaced.
+
+        The message is kept as is, only the frames that reach an inference cycle are converted.
+        '''
+        stamp = stamp_of(msg, self.get_clock())
+        with self._latest_lock:
+            if camera_name in self._latest:
+                self._frames_dropped += 1
+            self._latest[camera_name] = (stamp, msg)
+            self._frames_received += 1
+
+    def _logical_callback(self, msg, camera_name):
+        '''
+        Queue a logical camera frame and publish the frames of its camera labeled so far.
+        '''
+        for labeled in self.pipelines[camera_name].add_frame(stamp_of(msg, self.get_clock()), msg):
+            self.outputs[camera_name].publish(labeled)
+
+    def _to_bgr(self, name: str, msg):
+        '''
+        BGR frame of an RGB image message of a camera, None if it could not be converted.
+        '''
+        try:
+            return self._readers[name].to_bgr(msg)
+        except Exception as e:
+            self.get_logger().error('Error converting image: %s' % str(e))
+            return None
+
+    def _inference_cycle(self):
+        '''
+        Run the latest frame of every camera through the model in one batched call.
+
+        A frame is only converted as a whole for the scheduler, the detector
+        and the debug display, the classifier converts the crops of its slots.
+        '''
+        with self._latest_lock:
+            frames, self._latest = self._latest, {}
+        if not frames:
+            return
+        images = {}
+        for name, (_, msg) in frames.items():
+            if self.pipelines[name].uses_scheduler or self.displays[name].wants_frame():
+                images[name] = self._to_bgr(name, msg)
+
+        # Cameras with nothing new to label skip the model
+        names = []
+        for name, (stamp, _) in frames.items():
+            if name in images and images[name] is None:
+                continue
+            if self.pipelines[name].needs_inference(stamp, images.get(name)):
+                names.append(name)
+            else:
+                for labeled in self.pipelines[name].reuse_detections(stamp):
+                    self.outputs[name].publish(labeled)
+
+        if names and self.detector is None:
+            # Classifier mode, one call on the crops of the slots of every camera
+            results = classify_images(self.classifier, [(self.pipelines[name], *frames[name]) for name in names])
+            for name, labeled_frames in zip(names, results):
+                for labeled in labeled_frames:
+                    self.outputs[name].publish(labeled)
+            self._cycles += 1
+            self._frames_inferred += len(names)
+        elif names:
+            # The frames the scheduler and the display did not need are converted now
+            for name in names:
+                if name not in images:
+                    images[name] = self._to_bgr(name, frames[name][1])
+            names = [name for name in names if images[name] is not None]
+            if names:
+                # One result per image, in the order of the batch
+                results = self.detector([images[name] for name in names])
+                for name, (xyxy, conf, cls) in zip(names, results):
+                    for labeled in self.pipelines[name].add_detections(frames[name][0], xyxy, conf, cls):
+                        self.outputs[name].publish(labeled)
+                self._cycles += 1
+                self._frames_inferred += len(names)
+
+        for name, image in images.items():
+            if image is None or self.pipelines[name].last_boxes is None:
+                continue
+            xyxy, conf, cls = self.pipelines[name].last_boxes
+            self.displays[name].show(image, partial(draw_detections, xyxy=xyxy, conf=conf, cls=cls))
+
+def main(args=None):
+    rclpy.init(args=args)
+    server = YoloBatchServer()
+    executor = MultiThreadedExecutor()
+    executor.add_node(server)
+    executor.spin()
+    server.destroy_node()
+    rclpy.shutdown()
+
+if __name__ == '__main__':
+    main()
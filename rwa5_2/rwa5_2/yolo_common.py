@@ -0,0 +1,666 @@
+'''
+Shared pieces of the YOLO bin camera nodes.
+
+A BinCameraPipeline holds everything that is specific to one bin camera
+(topics, pixel mapping, last detections) and is independent of where the
+model runs, so the same pipeline serves the one-camera nodes
+(yolo_combined.py, yolonode_leftbin.py) and the batched server
+(yolo_batch_server.py).
+'''
+import threading
+from functools import partial
+
+import cv2
+import numpy as np
+
+import rclpy
+from rclpy.node import Node
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from sensor_msgs.msg import Image
+from ariac_msgs.msg import BasicLogicalCameraImage
+from robot_commander_msgs.msg import LogicalCameraLabels
+
+from camera_projection import CameraProjection, load_config
+from debug_images import FrameDisplay, declare_display_parameters
+from detection_matching import greedy_assignment, UNASSIGNED
+from detectors import load_classifier, load_detector
+from frame_labels import FrameLabeler, LABELS_QOS, labels_topic
+from frame_sync import stamp_of, ApproximateTimeSync, LatestFrameBuffer
+from image_ingest import ImageReader
+from inference_scheduler import InferenceScheduler
+from slot_cache import SlotCache, SLOT_HALF_SIZE
+
+# Weights used when the model_path parameter is not set
+DEFAULT_MODEL_PATH = "/home/mayank/ariac_ws/src/ARIAC_assigment/rwa5_2/rwa5_2/best.pt"
+
+# Classification weights of the slot crops used when the classifier_path parameter is not set. They are not
+# part of the repository: YOLO classification weights trained on bin slot crops, with the classes of CLASS_NAMES
+DEFAULT_CLASSIFIER_PATH = "/home/mayank/ariac_ws/src/ARIAC_assigment/rwa5_2/rwa5_2/best_cls.pt"
+
+# Minimum confidence of a detection
+CONFIDENCE_THRESHOLD = 0.7
+
+CLASS_NAMES = ["blue_battery", "blue_pump", "blue_regulator", "blue_sensor",
+               "green_battery", "green_pump", "green_regulator", "green_sensor",
+               "orange_battery", "orange_pump", "orange_regulator", "orange_sensor",
+               "purple_battery", "purple_pump", "purple_regulator", "purple_sensor",
+               "red_battery", "red_pump", "red_regulator", "red_sensor"]
+
+# Color and type names of the classes to the values of ariac_msgs/msg/Part
+PART_CONSTANTS = {
+    "battery": 10,
+    "pump": 11,
+    "regulator": 13,
+    "sensor": 12,
+    "green": 1,
+    "blue": 2,
+    "red": 0,
+    "orange": 3,
+    "purple": 4,
+}
+
+# Color and type of every class id
+CLASS_COLORS = np.array([PART_CONSTANTS[name.split('_')[0]] for name in CLASS_NAMES])
+CLASS_TYPES = np.array([PART_CONSTANTS[name.split('_')[1]] for name in CLASS_NAMES])
+
+# Bin cameras served by the YOLO nodes, each with a logical camera "<name>_logical" in the sensor YAML file
+BIN_CAMERAS = ("right_bins_camera", "left_bins_camera")
+
+
+def declare_models(node):
+    '''
+    Declare the parameters of the inference backend and load the model of the labeling mode.
+
+    Parameters:
+        mode -- "detector" to match the parts with the detections of the whole image,
+                "classifier" to classify the crops of the occupied bin slots
+        model_path -- Path of the detection model, see detectors.load_detector
+        classifier_path -- Path of the classification model, see detectors.load_classifier. The weights are
+                           trained by the user, the node fails at startup when they are missing
+        backend -- "ultralytics" to run the PyTorch weights, "onnx" to run their ONNX export with onnxruntime
+        input_size -- Input size of the onnx detector when the model has a dynamic input shape
+        num_threads -- Threads of the onnx backend, 0 to let onnxruntime decide
+
+    Args:
+        node (Node): The node
+
+    Returns:
+        Tuple: The detector and the classifier, None for the model the mode does not use
+    '''
+    mode = node.declare_parameter("mode", "detector").value
+    model_path = node.declare_parameter("model_path", DEFAULT_MODEL_PATH).value
+    classifier_path = node.declare_parameter("classifier_path", DEFAULT_CLASSIFIER_PATH).value
+    backend = node.declare_parameter("backend", "ultralytics").value
+    input_size = node.declare_parameter("input_size", 640).value
+    num_threads = node.declare_parameter("num_threads", 0).value
+    if mode == "classifier":
+        node.get_logger().info(f"Loading {classifier_path} with the {backend} backend")
+        return None, load_classifier(backend, classifier_path, num_threads)
+    if mode != "detector":
+        raise ValueError(f"Unknown labeling mode {mode}")
+    node.get_logger().info(f"Loading {model_path} with the {backend} backend")
+    return load_detector(backend, model_path, input_size, num_threads), None
+
+
+def draw_detections(image, xyxy, conf, cls):
+    '''
+    Draw the boxes and class names of the confident detections on an image.
+
+    Args:
+        image (np.ndarray): BGR image, modified in place
+        xyxy (np.ndarray): (N, 4) boxes x1, y1, x2, y2 in pixels
+        conf (np.ndarray): (N,) confidences
+        cls (np.ndarray): (N,) class ids
+    '''
+    for (x1, y1, x2, y2), confidence, class_id in zip(xyxy.astype(int).tolist(), conf.tolist(), cls.tolist()):
+        if confidence <= CONFIDENCE_THRESHOLD:
+            continue
+        cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 255), 3)
+        cv2.putText(image, CLASS_NAMES[class_id], [x1, y1], cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+
+
+def declare_pipeline_parameters(node) -> dict:
+    '''
+    Declare the parameters of the bin camera pipelines.
+
+    Parameters:
+        max_sync_skew -- Maximum time (s) between a logical camera frame and the RGB frame labeling it
+        max_match_distance -- Maximum distance (pixels) between a part and the detection labeling it
+        change_threshold -- Image change score (gray levels) from which the model runs again, 0 to run on every frame
+        refresh_period -- Maximum time (s) between two runs of the model on a camera
+        slot_cache -- Label the parts of unchanged bin slots from a cache, the model only running for new parts
+
+    Args:
+        node (Node): The node
+
+    Returns:
+        dict: Keyword arguments of BinCameraPipeline
+    '''
+    return {
+        "max_skew": node.declare_parameter("max_sync_skew", 0.2).value,
+        "max_match_distance": node.declare_parameter("max_match_distance", 40.0).value,
+        "change_threshold": node.declare_parameter("change_threshold", 10.0).value,
+        "refresh_period": node.declare_parameter("refresh_period", 5.0).value,
+        "slot_cache": node.declare_parameter("slot_cache", True).value,
+    }
+
+
+class FrameDetections():
+    '''
+    Confident detections of one RGB frame.
+    '''
+
+    __slots__ = ("centroids", "color", "type", "conf")
+
+    def __init__(self, xyxy, conf, cls):
+        '''
+        Keep the detections above CONFIDENCE_THRESHOLD.
+
+        Args:
+            xyxy (np.ndarray): (N, 4) boxes x1, y1, x2, y2 in pixels
+            conf (np.ndarray): (N,) confidences
+            cls (np.ndarray): (N,) class ids
+        '''
+        keep = conf > CONFIDENCE_THRESHOLD
+        boxes = xyxy[keep].astype(int)
+        # (M, 2) pixel centroids of the boxes
+        self.centroids = np.stack(((boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2), axis=1)
+        # (M,) color and type of the detections, values of ariac_msgs/msg/Part
+        self.color = CLASS_COLORS[cls[keep]]
+        self.type = CLASS_TYPES[cls[keep]]
+        self.conf = conf[keep]
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+
+class BinCameraPipeline():
+    '''
+    Labeling of the logical camera parts of one bin camera with the YOLO detections of its RGB camera.
+
+    Every logical camera frame is labeled with the detections of the RGB
+    frame closest in time (see frame_sync.ApproximateTimeSync), and frames
+    without a close enough RGB frame are dropped. With the slot cache, the
+    parts of the slots that kept their part are labeled from the cache and
+    only the frames with new parts wait for detections.
+
+    With a classifier, the RGB frames themselves are paired with the logical
+    camera frames instead of detections: the pixel box of every slot to
+    label is projected from the logical camera position of its part, and the
+    crops are classified in one call, shared by the cameras with
+    classify_images. Labels then need no association.
+    '''
+
+    def __init__(self, camera_name: str, projection: CameraProjection, logger,
+                 max_skew: float = 0.2, max_match_distance: float = 40.0,
+                 change_threshold: float = 10.0, refresh_period: float = 5.0, slot_cache: bool = True,
+                 classifier=None):
+        '''
+        Initialize the pipeline of a bin camera.
+
+        Args:
+            camera_name (str): Name of the camera, one of BIN_CAMERAS
+            projection (CameraProjection): Projection of the logical camera frame to the RGB image
+            logger: ROS logger of the node hosting the pipeline
+            max_skew (float): Maximum time (s) between a logical camera frame and the RGB frame labeling it
+            max_match_distance (float): Maximum distance (pixels) between a part and the detection labeling it
+            change_threshold (float): Image change score from which the model runs again, 0 to run on every frame
+            refresh_period (float): Maximum time (s) between two runs of the model
+            slot_cache (bool): Label the parts of unchanged slots from a SlotCache
+            classifier (UltralyticsClassifier | OnnxClassifier): Classifier of the slot crops, None to use detections
+        '''
+        self.camera_name = camera_name
+        self.rgb_topic = f"/ariac/sensors/{camera_name}/rgb_image"
+        self.logical_topic = f"/ariac/sensors/{camera_name}_logical/image"
+        self.output_topic = labels_topic(camera_name + "_logical")
+        self.projection = projection
+        self._logger = logger
+        self._max_match_distance = max_match_distance
+
+        # The RGB and logical camera callbacks may run in different threads
+        self._lock = threading.Lock()
+        self.sync = ApproximateTimeSync(max_skew)
+        self.scheduler = InferenceScheduler(change_threshold, refresh_period)
+        self.slot_cache = SlotCache() if slot_cache else None
+        self.classifier = classifier
+        self._crops = ImageReader()
+        self.labeler = FrameLabeler()
+
+        # Output of the last run of the model, served again for the frames it skips
+        self.last_boxes = None
+        self._last_detections = None
+
+    def add_detections(self, stamp: int, xyxy, conf, cls) -> list:
+        '''
+        Add the detections of one RGB frame.
+
+        Args:
+            stamp (int): Stamp of the RGB frame in nanoseconds
+            xyxy (np.ndarray): (N, 4) boxes x1, y1, x2, y2 in pixels
+            conf (np.ndarray): (N,) confidences
+            cls (np.ndarray): (N,) class ids
+
+        Returns:
+            List[LogicalCameraLabels]: Changed labels of the logical camera frames labeled with these detections
+        '''
+        detections = FrameDetections(xyxy, conf, cls)
+        self._logger.debug(f"{self.camera_name}: {len(detections)} detections")
+        with self._lock:
+            self.last_boxes = (xyxy, conf, cls)
+            self._last_detections = detections
+            pairs = self.sync.add_detections(stamp, detections)
+            return self._label_pairs(pairs)
+
+    def add_image(self, stamp: int, msg) -> list:
+        '''
+        Add an RGB frame whose slot crops label the logical camera frames paired with it (classifier mode).
+
+        Args:
+            stamp (int): Stamp of the RGB frame in nanoseconds
+            msg (Image): The RGB frame, kept until paired
+
+        Returns:
+            List[LogicalCameraLabels]: Changed labels of the logical camera frames labeled with this frame
+        '''
+        return classify_images(self.classifier, [(self, stamp, msg)])[0]
+
+    def collect_crops(self, stamp: int, msg) -> tuple:
+        '''
+        Pair an RGB frame with the logical camera frames and crop the slots they leave to label (classifier mode).
+
+        The crops are classified by the caller, with those of the other
+        cameras, and the results given back to label_crops.
+
+        Args:
+            stamp (int): Stamp of the RGB frame in nanoseconds
+            msg (Image): The RGB frame, kept until paired
+
+        Returns:
+            Tuple[list, List[np.ndarray]]: The frames to give to label_crops and their BGR crops, in order
+        '''
+        with self._lock:
+            self._last_detections = msg
+            frames, crops = [], []
+            for frame, image in self.sync.add_detections(stamp, msg):
+                msg_, labels, missing, points = self._unlabeled(frame)
+                rois = self._slot_rois(points, image)
+                crops.extend(self._crops.crops_bgr(image, [roi for roi in rois if roi is not None], len(crops)))
+                frames.append((msg_, labels, missing, points, rois))
+            return frames, crops
+
+    def label_crops(self, frames: list, cls, conf) -> list:
+        '''
+        Label the frames of collect_crops with the classification of their crops.
+
+        Args:
+            frames (list): The frames returned by collect_crops
+            cls (np.ndarray): (N,) class ids of the crops
+            conf (np.ndarray): (N,) confidences of the crops
+
+        Returns:
+            List[LogicalCameraLabels]: Changed labels of the frames
+        '''
+        with self._lock:
+            boxes, labeled = [], []
+            for msg, labels, missing, points, rois in frames:
+                start = len(boxes)
+                boxes.extend(roi for roi in rois if roi is not None)
+                found = self._crop_labels(rois, cls[start:len(boxes)], conf[start:len(boxes)])
+                labeled.append(self._store_labels(msg, labels, missing, points, found))
+            if boxes:
+                self.last_boxes = (np.array(boxes, dtype=float), conf, cls)
+            return [labels for labels in labeled if labels is not None]
+
+    @property
+    def uses_scheduler(self) -> bool:
+        '''
+        Returns:
+            bool: True if needs_inference compares the BGR frames, False if it only looks at the slot cache
+        '''
+        return self.slot_cache is None
+
+    def needs_inference(self, stamp: int, image=None) -> bool:
+        '''
+        Decide if the model runs on an RGB frame.
+
+        With the slot cache the model only runs while some parts of the
+        logical camera have no cached label, otherwise when the image changed
+        (see inference_scheduler.InferenceScheduler).
+
+        Args:
+            stamp (int): Stamp of the RGB frame in nanoseconds
+            image (np.ndarray): The BGR frame, only needed when uses_scheduler is True
+
+        Returns:
+            bool: True if the model must run on this frame
+        '''
+        if self.uses_scheduler:
+            return self.scheduler.should_run(stamp, image)
+        # The logical camera callback updates the slot cache in another thread
+        with self._lock:
+            return self.slot_cache.pending > 0
+
+    def reuse_detections(self, stamp: int) -> list:
+        '''
+        Add the detections of the last frame run through the model again, for an RGB frame the model skipped.
+
+        Args:
+            stamp (int): Stamp of the skipped RGB frame in nanoseconds
+
+        Returns:
+            List[LogicalCameraLabels]: Changed labels of the logical camera frames labeled with these detections
+        '''
+        with self._lock:
+            # Frames waiting for new slots need the detections of a frame showing them
+            if self._last_detections is None or self.slot_cache is not None:
+                return []
+            pairs = self.sync.add_detections(stamp, self._last_detections)
+            return self._label_pairs(pairs)
+
+    def add_frame(self, stamp: int, msg) -> list:
+        '''
+        Add a logical camera frame.
+
+        Args:
+            stamp (int): Stamp of the frame in nanoseconds
+            msg (BasicLogicalCameraImage): The frame
+
+        Returns:
+            List[LogicalCameraLabels]: Changed labels of the logical camera frames labeled so far
+        '''
+        with self._lock:
+            if self.slot_cache is None:
+                pairs = self.sync.add_frame(stamp, msg)
+                return self._label_pairs(pairs)
+
+            labels = self.slot_cache.lookup([(p.position.x, p.position.y, p.position.z) for p in msg.part_poses])
+            if not self.slot_cache.pending:
+                # Every part is cached, no need to wait for detections
+                return self._label_pairs([((msg, labels), None)])
+            pairs = self.sync.add_frame(stamp, (msg, labels))
+            return self._label_pairs(pairs)
+
+    def _match_detections(self, points, detections: FrameDetections) -> list:
+        '''
+        Labels of parts from the detections, matched one to one, closest pairs first, within max_match_distance pixels.
+
+        Returns:
+            List[Tuple[int, int, float]]: (color, type, confidence) of every part, None if not labeled
+        '''
+        if not len(detections):
+            return [None] * len(points)
+        pixels = self.projection.project(points)
+        assignment = greedy_assignment(pixels, detections.centroids, self._max_match_distance)
+        colors, types, conf = detections.color.tolist(), detections.type.tolist(), detections.conf.tolist()
+        return [None if match == UNASSIGNED else (colors[match], types[match], conf[match])
+                for match in assignment.tolist()]
+
+    def _classify(self, points, msg) -> list:
+        '''
+        Labels of parts from the classification of the crops of their slots in an RGB frame, in one call.
+
+        Returns:
+            List[Tuple[int, int, float]]: (color, type, confidence) of every part, None if not labeled
+        '''
+        rois = self._slot_rois(points, msg)
+        boxes = [roi for roi in rois if roi is not None]
+        if not boxes:
+            return [None] * len(points)
+        cls, conf = self.classifier(self._crops.crops_bgr(msg, boxes))
+        self.last_boxes = (np.array(boxes, dtype=float), conf, cls)
+        return self._crop_labels(rois, cls, conf)
+
+    def _slot_rois(self, points, msg) -> list:
+        '''
+        Pixel boxes of the slots of parts in an RGB frame.
+
+        Returns:
+            List[Tuple[int, int, int, int]]: x1, y1, x2, y2 of every slot, None if outside of the image
+        '''
+        return [self.projection.box(point, SLOT_HALF_SIZE, (msg.height, msg.width)) for point in points]
+
+    def _crop_labels(self, rois, cls, conf) -> list:
+        '''
+        Labels of the slots from the classification of their crops, one per box that is not None.
+
+        Returns:
+            List[Tuple[int, int, float]]: (color, type, confidence) of every slot, None if not labeled
+        '''
+        labels = []
+        results = iter(zip(cls.tolist(), conf.tolist()))
+        for roi in rois:
+            if roi is None:
+                labels.append(None)
+                continue
+            class_id, confidence = next(results)
+            confident = confidence > CONFIDENCE_THRESHOLD
+            labels.append((int(CLASS_COLORS[class_id]), int(CLASS_TYPES[class_id]), confidence) if confident else None)
+        return labels
+
+    def label_frame(self, frame, detections) -> LogicalCameraLabels:
+        '''
+        Label the parts of a logical camera frame with the cached labels and the detections.
+
+        The parts without a cached label are labeled by the detections, or by
+        the classifier in the RGB frame. Parts labeled this way enter the slot
+        cache.
+
+        Args:
+            frame: Frame of the logical camera, a BasicLogicalCameraImage, or with the slot cache
+                a (BasicLogicalCameraImage, labels) pair as given by SlotCache.lookup
+            detections: FrameDetections of the RGB frame paired with it, the RGB Image itself with a classifier,
+                None if there is none
+
+        Returns:
+            LogicalCameraLabels: Labels of the parts that could be labeled, None if the same as the last ones
+        '''
+        msg, labels, missing, points = self._unlabeled(frame)
+        found = []
+        if missing and detections is not None:
+            if self.classifier is not None:
+                found = self._classify(points, detections)
+            else:
+                found = self._match_detections(points, detections)
+        return self._store_labels(msg, labels, missing, points, found)
+
+    def _unlabeled(self, frame) -> tuple:
+        '''
+        Message, labels so far and parts left to label of a logical camera frame, as given to label_frame.
+
+        Returns:
+            Tuple[BasicLogicalCameraImage, list, List[int], list]: The message, the label of every part, None if
+                not labeled, and the indices and positions of the parts without a label
+        '''
+        msg, labels = frame if self.slot_cache is not None else (frame, None)
+        part_poses = msg.part_poses
+        labels = list(labels) if labels is not None else [None] * len(part_poses)
+        missing = [index for index, label in enumerate(labels) if label is None]
+        points = [(part_poses[index].position.x, part_poses[index].position.y, part_poses[index].position.z)
+                  for index in missing]
+        return msg, labels, missing, points
+
+    def _store_labels(self, msg, labels: list, missing: list, points: list, found: list) -> LogicalCameraLabels:
+        '''
+        Complete the labels of a frame with those found for its missing parts, which enter the slot cache.
+
+        Returns:
+            LogicalCameraLabels: Labels of the parts that could be labeled, None if the same as the last ones
+        '''
+        for index, point, label in zip(missing, points, found):
+            if label is None:
+                continue
+            labels[index] = label
+            if self.slot_cache is not None:
+                self.slot_cache.add(point, label)
+
+        return self.labeler.encode(
+            msg, [(index, label[0], label[1]) for index, label in enumerate(labels) if label is not None])
+
+    def _label_pairs(self, pairs) -> list:
+        '''
+        Label the paired logical camera frames, leaving out the labels that did not change.
+        '''
+        labeled = (self.label_frame(frame, detections) for frame, detections in pairs)
+        return [labels for labels in labeled if labels is not None]
+
+
+def classify_images(classifier, images: list) -> list:
+    '''
+    Add the RGB frames of bin cameras and classify the crops of all their slots in one call (classifier mode).
+
+    Args:
+        classifier (UltralyticsClassifier | OnnxClassifier): Classifier of the slot crops
+        images (List[Tuple[BinCameraPipeline, int, Image]]): Pipeline of the camera, stamp and RGB frame
+
+    Returns:
+        List[List[LogicalCameraLabels]]: Changed labels of the logical camera frames of every camera, in order
+    '''
+    collected = [pipeline.collect_crops(stamp, msg) for pipeline, stamp, msg in images]
+    crops = [crop for _, camera_crops in collected for crop in camera_crops]
+    if crops:
+        cls, conf = classifier(crops)
+    else:
+        cls, conf = np.empty(0, dtype=int), np.empty(0)
+
+    labeled, start = [], 0
+    for (pipeline, _, _), (frames, camera_crops) in zip(images, collected):
+        end = start + len(camera_crops)
+        labeled.append(pipeline.label_crops(frames, cls[start:end], conf[start:end]))
+        start = end
+    return labeled
+
+
+class YoloBinNode(Node):
+    '''
+    Node running the model of one bin camera, one RGB frame at a time.
+
+    The RGB callback only deposits the frames in a LatestFrameBuffer. The
+    model runs in a worker thread on the newest frame, the frames received
+    meanwhile being dropped, so the labels never lag behind a backlog.
+    '''
+
+    def __init__(self, node_name: str, camera_name: str):
+        '''
+        Initialize the node and its subscriptions.
+
+        Args:
+            node_name (str): Name of the node
+            camera_name (str): Name of the bin camera, one of BIN_CAMERAS
+        '''
+        super().__init__(node_name)
+        self.reader = ImageReader()
+        self.callback_group = MutuallyExclusiveCallbackGroup()
+        self.callback_group_2 = MutuallyExclusiveCallbackGroup()
+        self.qos_profile = rclpy.qos.qos_profile_sensor_data
+
+        self.detector, classifier = declare_models(self)
+        pipeline_parameters = declare_pipeline_parameters(self)
+        headless, debug_image_rate = declare_display_parameters(self)
+        projection = CameraProjection.from_config(
+            camera_name, load_config("new_sensors")["sensors"], load_config("camera_intrinsics"))
+        self.pipeline = BinCameraPipeline(
+            camera_name, projection, self.get_logger(), classifier=classifier, **pipeline_parameters)
+        self.display = FrameDisplay(self, camera_name, headless, debug_image_rate)
+
+        self.publisher_ = self.create_publisher(LogicalCameraLabels, self.pipeline.output_topic, LABELS_QOS)
+        # RGB frames not yet taken by the inference worker
+        self.frames = LatestFrameBuffer()
+        self.subscription = self.create_subscription(
+            Image, self.pipeline.rgb_topic, self.callback, 10, callback_group=self.callback_group)
+        self.subscription_ = self.create_subscription(
+            BasicLogicalCameraImage, self.pipeline.logical_topic, self.listener_callback,
+            self.qos_profile, callback_group=self.callback_group_2)
+        self.create_timer(60.0, self.log_buffer_stats)
+
+        self._worker = threading.Thread(target=self._inference_worker, name=f"{camera_name}_inference", daemon=True)
+        self._worker.start()
+
+    def destroy_node(self):
+        '''
+        Stop the inference worker and the debug images before destroying the node.
+        '''
+        self.frames.close()
+        self._worker.join()
+        self.display.close()
+        return super().destroy_node()
+
+    def log_buffer_stats(self):
+        '''
+        Log the occupancy of the frame and detection buffers.
+        '''
+        self.get_logger().info(f"{self.pipeline.camera_name} buffers: {self.pipeline.sync.stats}")
+        self.get_logger().info(f"{self.pipeline.camera_name} inference: {self.pipeline.scheduler.stats}")
+        self.get_logger().info(f"{self.pipeline.camera_name} images: {self.reader.stats}")
+        self.get_logger().info(f"{self.pipeline.camera_name} frames: {self.frames.stats}")
+        self.get_logger().info(f"{self.pipeline.camera_name} labels: {self.pipeline.labeler.stats}")
+        if self.pipeline.slot_cache is not None:
+            self.get_logger().info(f"{self.pipeline.camera_name} slots: {self.pipeline.slot_cache.stats}")
+
+    def listener_callback(self, msg):
+        '''
+        Queue a logical camera frame and publish the frames labeled so far.
+        '''
+        for labeled in self.pipeline.add_frame(stamp_of(msg, self.get_clock()), msg):
+            self.publisher_.publish(labeled)
+
+    def callback(self, msg):
+        '''
+        Deposit an RGB frame for the inference worker, replacing the frames it has not taken yet.
+        '''
+        self.frames.put(stamp_of(msg, self.get_clock()), msg)
+
+    def _inference_worker(self):
+        '''
+        Run the model on the newest RGB frame until the node is destroyed.
+        '''
+        while True:
+            entry = self.frames.take()
+            if entry is None:
+                return
+            try:
+                self.process_frame(*entry)
+            except Exception as e:
+                self.get_logger().error('Error processing image: %s' % str(e))
+
+    def _to_bgr(self, msg):
+        '''
+        BGR frame of an RGB image message, None if it could not be converted.
+        '''
+        try:
+            return self.reader.to_bgr(msg)
+        except Exception as e:
+            self.get_logger().error('Error converting image: %s' % str(e))
+            return None
+
+    def process_frame(self, stamp: int, msg):
+        '''
+        Run the model on an RGB frame and publish the logical camera frames it labels.
+
+        The whole frame is only converted for the scheduler, the detector and
+        the debug display, the classifier converts the crops of its slots.
+
+        Args:
+            stamp (int): Stamp of the frame in nanoseconds
+            msg (Image): The frame
+        '''
+        cv_image = None
+        if self.pipeline.uses_scheduler or self.display.wants_frame():
+            cv_image = self._to_bgr(msg)
+            if cv_image is None:
+                return
+
+        if not self.pipeline.needs_inference(stamp, cv_image):
+            labeled_frames = self.pipeline.reuse_detections(stamp)
+        elif self.detector is None:
+            labeled_frames = self.pipeline.add_image(stamp, msg)
+        else:
+            cv_image = self._to_bgr(msg) if cv_image is None else cv_image
+            if cv_image is None:
+                return
+            labeled_frames = self.pipeline.add_detections(stamp, *self.detector([cv_image])[0])
+        for labeled in labeled_frames:
+            self.publisher_.publish(labeled)
+
+        if cv_image is not None and self.pipeline.last_boxes is not None:
+            xyxy, conf, cls = self.pipeline.last_boxes
+            self.display.show(cv_image, partial(draw_detections, xyxy=xyxy, conf=conf, cls=cls))
@@ -0,0 +1,45 @@
+'''
+Projection of the kts logical camera detections, checked against the hand-tuned mapping it replaced.
+'''
+import os
+import sys
+
+import numpy as np
+import yaml
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config")
+sys.path.insert(0, os.path.join(os.path.dirname(CONFIG), "rwa5_2"))
+from camera_projection import CameraProjection  # noqa: E402
+
+# Depth (m) of the kts trays below the cameras, and y of the trays in the logical camera frame
+KTS_DEPTH = 1.07
+TRAY_Y = np.linspace(-0.52, 0.33, 6)
+
+
+def load(name):
+    with open(os.path.join(CONFIG, name + ".yaml"), "r") as file:
+        return yaml.safe_load(file)
+
+
+def tray_columns(camera_name):
+    projection = CameraProjection.from_config(camera_name, load("new_sensors")["sensors"], load("camera_intrinsics"))
+    return projection.project([(KTS_DEPTH, y, 0.0) for y in TRAY_Y])[:, 0]
+
+
+def hand_tuned_column(y):
+    '''
+    Column of the map_coordinates of yolonode_tray1.py, copied unchanged into yolonode_tray2.py.
+    '''
+    return (y + 0.52) / (0.33 + 0.52) * (180 - 458) + 458
+
+
+def test_kts1_matches_hand_tuned_mapping():
+    np.testing.assert_allclose(tray_columns("kts1_camera"), hand_tuned_column(TRAY_Y), atol=8.0)
+
+
+def test_kts2_mirrors_the_logical_camera_offset():
+    # Both logical cameras sit 0.1 m from their RGB camera along the world x axis, and the
+    # two cameras face each other, so the offset shifts the image columns in opposite directions
+    fx = load("camera_intrinsics")["default"]["fx"]
+    shift = 2 * 0.1 * fx / KTS_DEPTH
+    np.testing.assert_allclose(tray_columns("kts2_camera") - tray_columns("kts1_camera"), shift, atol=1e-6)
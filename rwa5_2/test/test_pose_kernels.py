@@ -0,0 +1,173 @@
+'''
+Equivalence of the NumPy pose kernels with the PyKDL computations they replace.
+
+The comparisons with PyKDL are skipped when it is not installed, the checks
+between the kernels themselves always run.
+'''
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+try:
+    import PyKDL
+except ImportError:
+    PyKDL = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rwa5_2"))
+import pose_kernels as PK  # noqa: E402
+
+# Poses of every random test, and the tolerance of the comparisons
+N = 200
+ATOL = 1e-9
+
+requires_kdl = pytest.mark.skipif(PyKDL is None, reason="PyKDL is not installed")
+
+
+def random_quats(rng, n):
+    '''
+    Unit quaternions uniformly distributed over the rotations.
+    '''
+    q = rng.normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def random_poses(rng, n):
+    '''
+    (n, 7) poses with random positions and unit quaternions.
+    '''
+    return np.hstack((rng.uniform(-3.0, 3.0, size=(n, 3)), random_quats(rng, n)))
+
+
+def near_zero_trace_quats():
+    '''
+    Quaternions whose rotation matrix has a trace near zero and near -1.
+
+    A trace of 0 is a rotation of 2*pi/3, at the switch from the trace branch
+    of GetQuaternion to the diagonal branches. A trace of -1 is a half turn,
+    which selects the x, y or z branch depending on the axis.
+    '''
+    quats = []
+    for axis in ([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0], [1.0, 1.0, 0.0], [1.0, -2.0, 3.0]):
+        axis = np.array(axis) / np.linalg.norm(axis)
+        for angle in (2 * math.pi / 3 - 1e-9, 2 * math.pi / 3, 2 * math.pi / 3 + 1e-9, math.pi - 1e-9, math.pi):
+            quats.append(np.append(axis * math.sin(angle / 2), math.cos(angle / 2)))
+    return np.array(quats)
+
+
+def gimbal_lock_rpys(rng):
+    '''
+    Angles with a pitch of exactly +/- pi/2 and random roll and yaw.
+    '''
+    rpy = rng.uniform(-math.pi, math.pi, size=(20, 3))
+    rpy[:10, 1] = math.pi / 2
+    rpy[10:, 1] = -math.pi / 2
+    return rpy
+
+
+def kdl_rotation(quat):
+    return PyKDL.Rotation.Quaternion(*quat)
+
+
+def kdl_frame(pose):
+    return PyKDL.Frame(kdl_rotation(pose[3:7]), PyKDL.Vector(*pose[0:3]))
+
+
+def kdl_pose(frame):
+    return np.array(list(frame.p) + list(frame.M.GetQuaternion()))
+
+
+def kdl_matrix_rotation(matrix):
+    return PyKDL.Rotation(*np.asarray(matrix).ravel().tolist())
+
+
+def assert_angles_close(actual, expected):
+    '''
+    Compare angles modulo 2*pi, atan2 may return pi on one side and -pi on the other.
+    '''
+    difference = (np.asarray(actual) - np.asarray(expected) + math.pi) % (2 * math.pi) - math.pi
+    np.testing.assert_allclose(difference, 0.0, atol=ATOL)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@requires_kdl
+def test_mult_pose_single(rng):
+    for pose_1, pose_2 in zip(random_poses(rng, N), random_poses(rng, N)):
+        expected = kdl_pose(kdl_frame(pose_1) * kdl_frame(pose_2))
+        np.testing.assert_allclose(PK.mult_pose(pose_1, pose_2), expected, atol=ATOL)
+
+
+@requires_kdl
+def test_mult_pose_batch(rng):
+    poses_1, poses_2 = random_poses(rng, N), random_poses(rng, N)
+    expected = np.array([kdl_pose(kdl_frame(p1) * kdl_frame(p2)) for p1, p2 in zip(poses_1, poses_2)])
+    np.testing.assert_allclose(PK.mult_pose(poses_1, poses_2), expected, atol=ATOL)
+
+    # One frame applied to a whole batch, as for the parts of a camera frame
+    expected = np.array([kdl_pose(kdl_frame(poses_1[0]) * kdl_frame(p2)) for p2 in poses_2])
+    np.testing.assert_allclose(PK.mult_pose(poses_1[0], poses_2), expected, atol=ATOL)
+
+
+@requires_kdl
+def test_mult_pose_near_zero_trace(rng):
+    # A pure translation as second frame keeps the rotation matrix of the first frame exact
+    quats = near_zero_trace_quats()
+    poses_1 = np.hstack((rng.uniform(-3.0, 3.0, size=(len(quats), 3)), quats))
+    pose_2 = np.array([0.1, -0.2, 0.3, 0.0, 0.0, 0.0, 1.0])
+    expected = np.array([kdl_pose(kdl_frame(p1) * kdl_frame(pose_2)) for p1 in poses_1])
+    np.testing.assert_allclose(PK.mult_pose(poses_1, pose_2), expected, atol=ATOL)
+    for pose_1, row in zip(poses_1, expected):
+        np.testing.assert_allclose(PK.mult_pose(pose_1, pose_2), row, atol=ATOL)
+
+
+@requires_kdl
+def test_quat_to_rpy(rng):
+    quats = np.vstack((random_quats(rng, N), near_zero_trace_quats()))
+    expected = np.array([kdl_rotation(q).GetRPY() for q in quats])
+    assert_angles_close(PK.quat_to_rpy(quats), expected)
+    for quat, row in zip(quats, expected):
+        assert_angles_close(PK.quat_to_rpy(quat), row)
+
+
+@requires_kdl
+def test_quat_to_rpy_gimbal_lock(rng):
+    quats = np.array([PyKDL.Rotation.RPY(*rpy).GetQuaternion() for rpy in gimbal_lock_rpys(rng)])
+    expected = np.array([kdl_rotation(q).GetRPY() for q in quats])
+    assert_angles_close(PK.quat_to_rpy(quats), expected)
+    for quat, row in zip(quats, expected):
+        assert_angles_close(PK.quat_to_rpy(quat), row)
+
+
+@requires_kdl
+def test_rpy_to_quat(rng):
+    rpys = np.vstack((rng.uniform(-math.pi, math.pi, size=(N, 3)), gimbal_lock_rpys(rng)))
+    expected = np.array([PyKDL.Rotation.RPY(*rpy).GetQuaternion() for rpy in rpys])
+    np.testing.assert_allclose(PK.rpy_to_quat(rpys), expected, atol=ATOL)
+    for rpy, row in zip(rpys, expected):
+        np.testing.assert_allclose(PK.rpy_to_quat(rpy), row, atol=ATOL)
+
+
+@requires_kdl
+def test_matrix_to_quat(rng):
+    # The same matrices are given to both sides, so the branches and quaternion signs must match
+    matrices = PK.quat_to_matrix(np.vstack((random_quats(rng, N), near_zero_trace_quats())))
+    expected = np.array([kdl_matrix_rotation(matrix).GetQuaternion() for matrix in matrices])
+    np.testing.assert_allclose(PK.matrix_to_quat(matrices), expected, atol=ATOL)
+    for matrix, row in zip(matrices, expected):
+        np.testing.assert_allclose(PK.matrix_to_quat(matrix), row, atol=ATOL)
+
+
+def test_matrix_to_quat_single_matches_batch(rng):
+    # A (3, 3) matrix takes the scalar fast path, a batch takes the vectorized branches
+    matrices = PK.quat_to_matrix(np.vstack((random_quats(rng, N), near_zero_trace_quats())))
+    batched = PK.matrix_to_quat(matrices)
+    single = np.array([PK.matrix_to_quat(matrix) for matrix in matrices])
+    np.testing.assert_allclose(single, batched, atol=1e-12)
+    for matrix, row in zip(matrices, batched):
+        np.testing.assert_allclose(PK.matrix_to_quat(matrix[None]), row[None], atol=1e-12)